@@ -1,21 +1,24 @@
+import asyncio
 import io
 from typing import List
 import uuid
-from datetime import datetime, time
+from datetime import date, datetime, time, timedelta
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
 import discord
-from channels.scanner import get_active_channels_and_threads, get_text_channel
+from channels.scanner import (
+    get_active_channels_and_threads,
+    get_configured_channels_and_threads,
+    get_text_channel,
+)
 from config import AppSettings, get_config
 from discord import ForumChannel, TextChannel, app_commands
 from discord.ext import tasks
 from discord.message import Message
 from discordbot import DiscordBotClient
 from dpn_pyutils.common import get_logger
-from humanitix.client import HumanitixClient
 from humanitix.maxhealth import apply_maxhealth_info
-from humanitix.summary import create_summary_from_event_data
 from render import render_template, split_rendered_text_max_length
 from rendering.graphic import (
     create_image_tix_animated,
@@ -56,6 +59,12 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
         run_at_time.tzinfo,
     )
 
+    # The daily summary is prepared ahead of time, then topped up shortly before posting
+    precompute_lead = timedelta(seconds=config.SUMMARY_PRECOMPUTE_LEAD_SECONDS)
+    prepare_at_time = (
+        datetime.combine(date.today(), run_at_time) - precompute_lead
+    ).timetz()
+
     # Declare intents
     intents = discord.Intents.default()
     intents.messages = True
@@ -74,8 +83,19 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
         log.debug(
             "Announcing to channel #%s (%s)", announce_channel.name, announce_channel.id
         )
-        daily_channel_message_count.start()
+        if config.SUMMARY_PRECOMPUTE_LEAD_SECONDS > 0:
+            log.debug("Preparing the daily summary at %s", prepare_at_time)
+            daily_summary_pipeline.start()
+        else:
+            daily_channel_message_count.start()
         cron_prune_summarizer.start()
+        cron_sync_ledger.start()
+        cron_flush_spend.start()
+        if config.SUMMARISER_MOD_DIGEST_INTERVAL > 0:
+            cron_mod_digest.start()
+
+        if config.SUMMARISER_WARM_ENABLE:
+            cron_warm_digests.start()
 
         if config.PRUNER_ENABLE:
             cron_pruner.start()
@@ -103,6 +123,61 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
         log.debug("Running prune on summarizer")
         client.summariser.prune()
 
+    @tasks.loop(seconds=config.SUMMARISER_SPEND_FLUSH_INTERVAL)
+    async def cron_flush_spend():
+        """
+        Writes buffered spend entries to the local ledger in batches
+        """
+
+        try:
+            client.summariser.recorder.flush()
+        except Exception as e:
+            log.error("Error writing spend entries to the ledger: %s", e)
+
+    @tasks.loop(seconds=max(config.SUMMARISER_MOD_DIGEST_INTERVAL, 1))
+    async def cron_mod_digest():
+        """
+        Posts the consolidated report of recent summaries to the mod channel
+        """
+
+        try:
+            mod_channel = client.get_channel(config.SUMMARISER_MOD_CHANNEL)
+            await client.summariser.send_mod_digest(mod_channel)  # type: ignore
+        except Exception as e:
+            log.error("Error sending mod digest: %s", e)
+
+    @tasks.loop(seconds=config.SUMMARISER_LEDGER_SYNC_INTERVAL)
+    async def cron_sync_ledger():
+        """
+        Copies new spend ledger entries to the portal spend history
+        """
+
+        try:
+            await client.summariser.sync_ledger()
+        except Exception as e:
+            log.error("Error syncing spend ledger to the portal: %s", e)
+
+    @tasks.loop(seconds=config.SUMMARISER_WARM_INTERVAL)
+    async def cron_warm_digests():
+        """
+        Speculatively generates digests for busy channels so that /digest answers instantly
+        """
+
+        for channel_id in client.summariser.warmer.get_channels_to_warm():
+            if client.summariser.active_interactions > 0:
+                log.debug("Deferring digest warming while interactions are in progress")
+                return
+
+            channel = client.get_channel(channel_id)
+            if channel is None or client.user is None:
+                client.summariser.warmer.mark_warmed(channel_id)
+                continue
+
+            try:
+                await client.summariser.warm_channel(channel, client.user)  # type: ignore
+            except Exception as e:
+                log.error("Error warming digest for channel %s: %s", channel_id, e)
+
     @tasks.loop(time=run_at_time)
     async def daily_channel_message_count(announce_channel_id: int | None = None):
 
@@ -124,6 +199,97 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
         # Valid announcement channel exists, proceed with gathering data and rendering the announcement
         channels, threads = await get_active_channels_and_threads(client)
 
+        await send_announcement(announce_channel, channels, threads)
+
+        # Send the summary of the text chat to the announce channel
+        await daily_summariser_message(announce_channel, channels, threads)
+
+    @tasks.loop(time=prepare_at_time)
+    async def daily_summary_pipeline():
+        """
+        Prepares the daily summary ahead of the scheduled time, tops it up with any
+        messages that arrived in the meantime and posts it at the scheduled time
+        """
+
+        now = datetime.now(configured_tz)
+        post_at = datetime.combine(now.date(), run_at_time)
+        if post_at <= now:
+            post_at += timedelta(days=1)
+
+        log.info("Preparing the daily summary to be posted at %s", post_at)
+
+        announce_channel = await get_text_channel(
+            client, config.DISCORD_POST_MESSAGE_CHANNEL
+        )
+        if announce_channel is None:
+            log.error(
+                "Could not find channel '%s' and hence cannot prepare the daily summary.",
+                config.DISCORD_POST_MESSAGE_CHANNEL,
+            )
+            return
+
+        try:
+            channels, threads = await get_active_channels_and_threads(client)
+            prepared = await client.summariser.prepare_summary_daily_message(
+                announce_channel, client.user, channels, threads  # type: ignore
+            )
+        except Exception as e:
+            log.error("Error preparing daily summary: %s", e)
+            await discord.utils.sleep_until(post_at)
+            await daily_channel_message_count()
+            return
+
+        await discord.utils.sleep_until(
+            post_at - timedelta(seconds=config.SUMMARY_TOPUP_LEAD_SECONDS)
+        )
+
+        # Include channels that became active while the summary was being prepared
+        recent_channels, recent_threads = get_configured_channels_and_threads(
+            client, client.summariser.get_channels_with_messages_since(now)
+        )
+        channels.extend(c for c in recent_channels if c not in channels)
+        threads.extend(t for t in recent_threads if t not in threads)
+
+        if prepared is not None:
+            try:
+                prepared = await asyncio.wait_for(
+                    client.summariser.top_up_summary_daily_message(
+                        prepared,
+                        announce_channel,
+                        client.user,  # type: ignore
+                        channels,
+                        threads,
+                    ),
+                    timeout=max(
+                        0.0, (post_at - datetime.now(configured_tz)).total_seconds()
+                    ),
+                )
+            except Exception as e:
+                log.warn("Posting the daily summary without a top up: %s", e)
+
+        await discord.utils.sleep_until(post_at)
+
+        await send_announcement(announce_channel, channels, threads)
+
+        if prepared is None:
+            return
+
+        try:
+            await client.summariser.send_summary_daily_message(
+                announce_channel, prepared
+            )
+        except Exception as e:
+            log.error("Error sending daily summary: %s", e)
+
+    async def send_announcement(
+        announce_channel: TextChannel,
+        channels: List[TextChannel],
+        threads: List[ForumChannel],
+    ):
+        """
+        Renders and sends the daily activity announcement
+        """
+
         log.debug(
             "Sending announcement to channel #%s (%s)",
             announce_channel.name,
@@ -151,9 +317,6 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
         else:
             await announce_channel.send(announcement)
 
-        # Send the summary of the text chat to the announce channel
-        await daily_summariser_message(announce_channel, channels, threads)
-
     async def daily_summariser_message(
         announce_channel: TextChannel, channels: List[TextChannel], threads: List[ForumChannel]
     ):
@@ -163,7 +326,10 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
 
         try:
             await client.summariser.generate_summary_daily_message(
-                announce_channel=announce_channel, channels=channels, threads=threads
+                announce_channel=announce_channel,
+                user=client.user,  # type: ignore
+                channels=channels,
+                threads=threads,
             )
         except Exception as e:
             log.error("Error generating daily summary: %s", e)
@@ -183,6 +349,10 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
                 await message.reply(f"An error occurred: {e}")
 
         client.summariser.record_message(message.channel.id, message)
+        if config.SUMMARISER_WARM_ENABLE:
+            client.summariser.warmer.record_message(
+                message.channel.id, message.created_at
+            )
 
     @client.event
     async def on_message_edit(before: Message, after: Message):
@@ -200,6 +370,22 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
 
         client.summariser.delete_message(message.channel.id, message.id)
 
+    @client.event
+    async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
+        """
+        Records a reaction on a message
+        """
+
+        client.summariser.update_reactions(payload.channel_id, payload.message_id, 1)
+
+    @client.event
+    async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
+        """
+        Records a reaction removed from a message
+        """
+
+        client.summariser.update_reactions(payload.channel_id, payload.message_id, -1)
+
     @client.tree.command(
         name="activity",
         description="Gets the activity summary for the day since the configured time",
@@ -235,6 +421,15 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
         """
         await humanitix_summary(ctx, subnet, format)
 
+    @on_humanitix_graphics.autocomplete("subnet")
+    async def on_humanitix_graphics_subnet(
+        ctx: discord.interactions.Interaction, current: str
+    ) -> List[app_commands.Choice[str]]:
+        """
+        Suggests subnets for the graphics command
+        """
+        return get_subnet_choices(current)
+
     @client.tree.command(
         name="tixt",
         description="Get the Humanitix data in text format for all or some of the subnets",
@@ -251,6 +446,15 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
         """
         await humanitix_summary(ctx, subnet, "text")
 
+    @on_humanitix_text.autocomplete("subnet")
+    async def on_humanitix_text_subnet(
+        ctx: discord.interactions.Interaction, current: str
+    ) -> List[app_commands.Choice[str]]:
+        """
+        Suggests subnets for the text command
+        """
+        return get_subnet_choices(current)
+
     @client.tree.command(
         name="digest",
         description="Generates a summary of the recent messages in this channel (up to 24h)",
@@ -269,6 +473,42 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
         except Exception as e:
             log.error("Error generating summary: %s", e)
 
+    @client.tree.command(
+        name="spend",
+        description="Reports the GenAI spend by user, channel and day over a date range",
+    )
+    @app_commands.describe(
+        time_period="The time period to report on when no start date is given, e.g. '30d'",
+        start_date="The first day to report on, in the form YYYY-MM-DD",
+        end_date="The last day to report on, in the form YYYY-MM-DD (defaults to now)",
+        limit="The number of top users and channels to list",
+    )
+    @app_commands.default_permissions(manage_messages=True)
+    async def on_spend_report(
+        ctx: discord.interactions.Interaction,
+        time_period: str = "30d",
+        start_date: str | None = None,
+        end_date: str | None = None,
+        limit: app_commands.Range[int, 1, 25] = 10,
+    ):
+        try:
+            await client.summariser.send_spend_report(
+                ctx, time_period, start_date, end_date, limit
+            )
+        except Exception as e:
+            log.error("Error sending spend report: %s", e)
+
+    def get_subnet_choices(current: str) -> List[app_commands.Choice[str]]:
+        """
+        Gets the autocomplete choices for a subnet from the cached events
+        """
+
+        # Discord limits choice names and values to 100 characters
+        return [
+            app_commands.Choice(name=name[:100], value=name[:100])
+            for name in client.tix_cache.get_event_names(current)
+        ]
+
     async def humanitix_summary(
         ctx: discord.interactions.Interaction,
         subnet: str | None = None,
@@ -289,9 +529,8 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
                 )
                 return
 
-            humanitix_client = HumanitixClient()
-            events = await humanitix_client.filter_events_by_name(subnet)
-            if events is None:
+            summary_data = await client.tix_cache.get_summary(subnet)
+            if summary_data is None:
                 message = "No events found"
                 if subnet is not None:
                     message = f"No events found for '{subnet}'"
@@ -299,8 +538,6 @@ def create_bot(config: AppSettings) -> DiscordBotClient:
                 await ctx.followup.send(message, ephemeral=True)
                 return
 
-            summary_data = await create_summary_from_event_data(events)
-
             summary_data = await apply_maxhealth_info(summary_data)
 
             if format.lower() == "text":
@@ -65,7 +65,7 @@ async def get_active_channels_and_threads(client: discord.Client) -> Tuple[List,
 
                     if channel.type == discord.ChannelType.text:
                         last_message = await channel.fetch_message(
-                            channel.last_message_id # type: ignore
+                            channel.last_message_id  # type: ignore
                         )
                         last_message_date = last_message.created_at
                         if last_message_date.replace(
@@ -105,3 +105,27 @@ async def get_active_channels_and_threads(client: discord.Client) -> Tuple[List,
 
     return channels, threads
 
+
+def get_configured_channels_and_threads(
+    client: discord.Client, channel_ids: List[int]
+) -> Tuple[List, List]:
+    """
+    Resolves channel ids from the client cache into the text channels and threads that
+    belong to the configured categories
+    """
+
+    channels = []
+    threads = []
+    for channel_id in channel_ids:
+        channel = client.get_channel(channel_id)
+        if isinstance(channel, discord.Thread):
+            if (
+                channel.parent is not None
+                and channel.parent.category_id in config.DISCORD_BOT_CATEGORY_IDS
+            ):
+                threads.append(channel)
+        elif isinstance(channel, discord.TextChannel):
+            if channel.category_id in config.DISCORD_BOT_CATEGORY_IDS:
+                channels.append(channel)
+
+    return channels, threads
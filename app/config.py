@@ -1,13 +1,27 @@
 import os
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
 from dotenv import load_dotenv
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
 ENV_FILENAME = os.environ.get("DOTENV", ".env")
 
 
+class ModelRoute(BaseModel):
+    """
+    A model tier that digests are routed to when they fit its size thresholds
+    """
+
+    name: str
+    model: str
+    max_prompt_tokens: int
+    max_period_hours: float | None = None
+    max_tokens: int
+    token_cost: float | None = None
+
+
 class AppSettings(BaseSettings):
 
     LOGGING_CONFIG_FILE: str
@@ -16,6 +30,8 @@ class AppSettings(BaseSettings):
     TIMEZONE: str
     DISCORD_TOKEN: str
     SUMMARY_POST_AT_LOCALTIME: str
+    SUMMARY_PRECOMPUTE_LEAD_SECONDS: int = 0
+    SUMMARY_TOPUP_LEAD_SECONDS: int = 60
     DISCORD_BOT_GUILD_ID: int
     DISCORD_BOT_CATEGORY_IDS: List[int]
     DISCORD_POST_MESSAGE_CHANNEL: int
@@ -31,6 +47,20 @@ class AppSettings(BaseSettings):
     RENDER_CONTEXT: str
     HUMANITIX_API: str
     HUMANITIX_API_TOKEN: str
+    HUMANITIX_API_HTTP2: bool = False
+    HUMANITIX_API_TIMEOUT: float = 30.0
+    HUMANITIX_API_MAX_CONNECTIONS: int = 10
+    HUMANITIX_API_RETRIES: int = 3
+    HUMANITIX_API_RETRY_BACKOFF: float = 1.0
+    HUMANITIX_API_RATE_LIMIT: float = 5.0
+    HUMANITIX_API_RATE_BURST: int = 10
+    HUMANITIX_API_MAX_IN_FLIGHT: int = 8
+    HUMANITIX_API_PAGE_CONCURRENCY: int = 4
+    HUMANITIX_SUMMARY_CONCURRENCY: int = 8
+    HUMANITIX_TICKET_FULL_SYNC_INTERVAL: int = 3600
+    HUMANITIX_TICKET_SYNC_OVERLAP: int = 60
+    HUMANITIX_SUMMARY_CACHE_TTL: int = 60
+    HUMANITIX_LEAN_PARSING: bool = True
     LOANER_LAPTOP_QUESTION: str
     RENDER_TIX_SCREEN_WIDTH: int
     RENDER_TIX_SCREEN_HEIGHT: int
@@ -43,19 +73,51 @@ class AppSettings(BaseSettings):
     OPENAI_MODEL: str
     OPENAI_MODEL_CONTEXT_WINDOW: int
     OPENAI_TOKEN_COST: float
+    OPENAI_CACHED_TOKEN_COST_FACTOR: float = 0.5
     DADLAN_WAN_API_KEY: str
     DADLAN_WAN_API_URL: str
+    DADLAN_WAN_API_TIMEOUT: float = 10.0
+    DADLAN_WAN_API_RETRIES: int = 2
+    DADLAN_WAN_API_RETRY_BACKOFF: float = 0.5
+    DADLAN_WAN_API_MAX_CONNECTIONS: int = 10
+    DADLAN_WAN_API_BULK_ENABLE: bool = False
+    DADLAN_WAN_API_CACHE_TTL: int = 300
+    DADLAN_WAN_API_CACHE_TTLS: Dict[str, int] = {}
     SUMMARISER_VAR_TEMPERATURE: str
     SUMMARISER_VAR_MAX_TOKENS: str
     SUMMARISER_VAR_MODEL: str
     SUMMARISER_VAR_PROMPT_PREFIX: str
     SUMMARISER_VAR_PROMPT_SUFFIX: str
     SUMMARISER_VAR_SPEND_HISTORY: str
+    SUMMARISER_LEDGER_FILE: str = "/data/spend_ledger.sqlite3"
+    SUMMARISER_LEDGER_SYNC_INTERVAL: int = 300
+    SUMMARISER_SPEND_HISTORY_COMPRESS: bool = False
+    SUMMARISER_SPEND_FLUSH_INTERVAL: int = 5
+    SUMMARISER_SPEND_FLUSH_BATCH_SIZE: int = 500
     SUMMARISER_PRUNE_INTERVAL: int
     SUMMARISER_MESSAGE_AGE_THRESHOLD: int
     SUMMARISER_RESPONSE_CACHE_EXPIRY: int
     SUMMARISER_MOD_CHANNEL: int
     SUMMARISER_IGNORE_APPLICATION_MESSAGES: bool
+    SUMMARISER_EXTRACTIVE_ENABLE: bool = False
+    SUMMARISER_EXTRACTIVE_MIN_MESSAGES: int = 500
+    SUMMARISER_EXTRACTIVE_TOKEN_BUDGET: int = 8000
+    SUMMARISER_MODEL_ROUTES: List[ModelRoute] = []
+    SUMMARISER_OUTPUT_TOKEN_RATIO: float = 0.1
+    SUMMARISER_MIN_OUTPUT_TOKENS: int = 100
+    SUMMARISER_QUOTA_USER_MONTHLY: float = 0.0
+    SUMMARISER_QUOTA_CHANNEL_MONTHLY: float = 0.0
+    SUMMARISER_QUOTA_DAILY: float = 0.0
+    SUMMARISER_QUOTA_MIN_PROMPT_TOKENS: int = 500
+    SUMMARISER_MOD_DIGEST_INTERVAL: int = 0
+    SUMMARISER_MOD_DIGEST_OUTLIER_COST: float = 0.01
+    SUMMARISER_WARM_ENABLE: bool = False
+    SUMMARISER_WARM_INTERVAL: int = 60
+    SUMMARISER_WARM_MESSAGE_THRESHOLD: int = 50
+    SUMMARISER_WARM_BURST_MESSAGES: int = 10
+    SUMMARISER_WARM_QUIET_SECONDS: int = 300
+    SUMMARISER_WARM_DAILY_BUDGET: float = 0.05
+    SUMMARISER_WARM_CACHE_EXPIRY: int = 1800
     PRUNER_ENABLE: bool
     PRUNER_AUTOPRUNE_CHANNELS: List[int]
     PRUNER_IGNORE_MESSAGES: List[int]
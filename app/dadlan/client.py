@@ -1,5 +1,10 @@
+import asyncio
+import time
+from typing import Dict, List, Set
+
 import httpx
 from config import get_config
+from dadlan.schemas import CachedVariable
 from dpn_pyutils.common import get_logger
 
 log = get_logger(__name__)
@@ -7,43 +12,337 @@ log = get_logger(__name__)
 config = get_config()
 
 
-def get_variable(variable_name: str, default_value: str) -> str:
+class PortalClient:
     """
-    Gets a variable from the DadLAN WAN Portal
+    Client for the DadLAN WAN Portal variables API. Requests share one keep-alive connection
+    pool and are retried on connection errors and server errors.
+
+    Variables are cached in memory with a per-variable TTL. An expired value is served while
+    it is refreshed in the background, and the last known good value is served while the
+    portal is unreachable.
     """
 
-    url = f"{config.DADLAN_WAN_API_URL}/api/v1/sys/variables/{variable_name}"
-    headers = {"X-Authorization": config.DADLAN_WAN_API_KEY}
+    http_client: httpx.AsyncClient | None
+    cache: Dict[str, CachedVariable]
+    refreshing: Set[str]
+    bulk_supported: bool
+    background_tasks: Set[asyncio.Task]
+
+    def __init__(self) -> None:
+        """
+        Initializes the client, the connection pool is created on first use
+        """
+
+        self.http_client = None
+        self.cache = {}
+        self.refreshing = set()
+        self.bulk_supported = True
+        self.background_tasks = set()
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        """
+        Gets the shared HTTP client
+        """
+
+        if self.http_client is None or self.http_client.is_closed:
+            self.http_client = httpx.AsyncClient(
+                base_url=f"{config.DADLAN_WAN_API_URL}/api/v1/sys/variables/",
+                headers={"X-Authorization": config.DADLAN_WAN_API_KEY},
+                timeout=httpx.Timeout(config.DADLAN_WAN_API_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=config.DADLAN_WAN_API_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.DADLAN_WAN_API_MAX_CONNECTIONS,
+                ),
+            )
+
+        return self.http_client
+
+    async def request(
+        self, method: str, variable_name: str, **kwargs
+    ) -> httpx.Response:
+        """
+        Makes a request for a variable, retrying connection errors and server errors with
+        exponential backoff
+        """
 
-    response = httpx.get(url, headers=headers)
+        for attempt in range(config.DADLAN_WAN_API_RETRIES + 1):
+            try:
+                response = await self.get_http_client().request(
+                    method, variable_name, **kwargs
+                )
+                if (
+                    response.status_code < 500
+                    or attempt == config.DADLAN_WAN_API_RETRIES
+                ):
+                    return response
 
-    if response.status_code != 200:
-        log.error(
-            "Failed to get variable '%s'. %s: %s",
-            variable_name,
-            response.status_code,
-            response.text,
+                log.warn(
+                    "Portal returned %s for '%s', retrying",
+                    response.status_code,
+                    variable_name,
+                )
+            except httpx.TransportError as e:
+                if attempt == config.DADLAN_WAN_API_RETRIES:
+                    raise
+
+                log.warn(
+                    "Portal request for '%s' failed, retrying: %s", variable_name, e
+                )
+
+            await asyncio.sleep(config.DADLAN_WAN_API_RETRY_BACKOFF * 2**attempt)
+
+        raise RuntimeError("Unreachable")
+
+    def get_ttl(self, variable_name: str) -> float:
+        """
+        Gets the cache TTL of a variable
+        """
+
+        return config.DADLAN_WAN_API_CACHE_TTLS.get(
+            variable_name, config.DADLAN_WAN_API_CACHE_TTL
         )
-        return default_value
 
-    return response.json()["value"]
+    def cache_variable(
+        self, variable_name: str, value: str, etag: str | None = None
+    ) -> None:
+        """
+        Stores a fetched variable in the cache
+        """
 
+        self.cache[variable_name] = CachedVariable(
+            value=value,
+            fetched_at=time.monotonic(),
+            ttl=self.get_ttl(variable_name),
+            etag=etag,
+        )
 
-def set_variable(variable_name: str, value: str) -> None:
-    """
-    Sets the variable to a specific value
-    """
+    async def fetch_variable(self, variable_name: str) -> str | None:
+        """
+        Fetches a variable from the portal and caches it. Returns None if the portal does
+        not have it. If the cached value has an ETag, the portal only sends the value if it
+        has changed.
+        """
 
-    url = f"{config.DADLAN_WAN_API_URL}/api/v1/sys/variables/{variable_name}"
-    headers = {"X-Authorization": config.DADLAN_WAN_API_KEY}
+        headers = {}
+        cached = self.cache.get(variable_name)
+        if cached is not None and cached.etag is not None:
+            headers["If-None-Match"] = cached.etag
 
-    response = httpx.put(url, headers=headers, json={"value": value})
+        response = await self.request("GET", variable_name, headers=headers)
 
-    if response.status_code != 200:
-        log.error(
-            "Failed to set variable '%s'. %s: %s",
-            variable_name,
-            response.status_code,
-            response.text,
+        if response.status_code == 304 and cached is not None:
+            cached.fetched_at = time.monotonic()
+            return cached.value
+
+        if response.status_code != 200:
+            log.error(
+                "Failed to get variable '%s'. %s: %s",
+                variable_name,
+                response.status_code,
+                response.text,
+            )
+            if cached is not None:
+                # Keep serving the cached value until it expires again
+                cached.fetched_at = time.monotonic()
+            return None
+
+        value = response.json()["value"]
+        self.cache_variable(variable_name, value, response.headers.get("ETag"))
+
+        return value
+
+    async def fetch_variables(self, variable_names: List[str]) -> Dict[str, str] | None:
+        """
+        Fetches several variables in one request to the bulk endpoint and caches them.
+        Returns None if the portal does not support bulk requests.
+        """
+
+        response = await self.request(
+            "GET", "", params={"names": ",".join(variable_names)}
         )
+
+        if response.status_code in (404, 405, 501):
+            log.info(
+                "Portal does not support bulk variable requests (%s), fetching one by one",
+                response.status_code,
+            )
+            self.bulk_supported = False
+            return None
+
         response.raise_for_status()
+
+        values = {}
+        for variable in response.json()["variables"]:
+            values[variable["name"]] = variable["value"]
+            self.cache_variable(
+                variable["name"], variable["value"], variable.get("etag")
+            )
+
+        return values
+
+    async def refresh_variable(self, variable_name: str) -> None:
+        """
+        Refreshes a cached variable, keeping the cached value if the portal is unreachable
+        """
+
+        try:
+            await self.fetch_variable(variable_name)
+        except httpx.HTTPError as e:
+            log.warn("Could not refresh variable '%s': %s", variable_name, e)
+        finally:
+            self.refreshing.discard(variable_name)
+
+    async def get_variable(
+        self, variable_name: str, default_value: str, max_age: float | None = None
+    ) -> str:
+        """
+        Gets a variable from the DadLAN WAN Portal, from the cache if it is fresh enough.
+        A max age of 0 always fetches the current value.
+        """
+
+        cached = self.cache.get(variable_name)
+        if cached is not None and max_age != 0:
+            age = time.monotonic() - cached.fetched_at
+            if age < (max_age if max_age is not None else cached.ttl):
+                return cached.value
+
+            if max_age is None:
+                # Serve the stale value now and refresh it for the next caller
+                if variable_name not in self.refreshing:
+                    self.refreshing.add(variable_name)
+                    task = asyncio.create_task(self.refresh_variable(variable_name))
+                    self.background_tasks.add(task)
+                    task.add_done_callback(self.background_tasks.discard)
+
+                return cached.value
+
+        try:
+            value = await self.fetch_variable(variable_name)
+        except httpx.HTTPError as e:
+            if cached is None:
+                raise
+
+            log.warn(
+                "Portal unreachable, using last known value of '%s': %s",
+                variable_name,
+                e,
+            )
+            return cached.value
+
+        if value is None:
+            if cached is not None:
+                return cached.value
+
+            # Cache the default as well, so that a variable the portal does not have is not
+            # requested again on every call
+            self.cache_variable(variable_name, default_value)
+            return default_value
+
+        return value
+
+    async def get_variables(self, default_values: Dict[str, str]) -> Dict[str, str]:
+        """
+        Gets several variables from the DadLAN WAN Portal, fetching the ones that are not
+        cached or have expired in one round trip where the portal supports it
+        """
+
+        values = {}
+        expired_names = []
+        for variable_name in default_values:
+            cached = self.cache.get(variable_name)
+            if cached is not None and time.monotonic() - cached.fetched_at < cached.ttl:
+                values[variable_name] = cached.value
+            else:
+                expired_names.append(variable_name)
+
+        if len(expired_names) == 0:
+            return values
+
+        fetched = None
+        if config.DADLAN_WAN_API_BULK_ENABLE and self.bulk_supported:
+            try:
+                fetched = await self.fetch_variables(expired_names)
+            except httpx.HTTPError as e:
+                log.warn("Bulk variable request failed, fetching one by one: %s", e)
+
+        if fetched is None:
+            fetched_values = await asyncio.gather(
+                *(self.get_variable(n, default_values[n]) for n in expired_names)
+            )
+            fetched = dict(zip(expired_names, fetched_values))
+
+        for variable_name in expired_names:
+            if variable_name in fetched:
+                values[variable_name] = fetched[variable_name]
+            elif variable_name in self.cache:
+                values[variable_name] = self.cache[variable_name].value
+            else:
+                values[variable_name] = default_values[variable_name]
+                self.cache_variable(variable_name, default_values[variable_name])
+
+        return values
+
+    def invalidate_variable(self, variable_name: str) -> None:
+        """
+        Drops a variable from the cache
+        """
+
+        self.cache.pop(variable_name, None)
+
+    async def set_variable(self, variable_name: str, value: str) -> None:
+        """
+        Sets the variable to a specific value
+        """
+
+        response = await self.request("PUT", variable_name, json={"value": value})
+        self.invalidate_variable(variable_name)
+
+        if response.status_code != 200:
+            log.error(
+                "Failed to set variable '%s'. %s: %s",
+                variable_name,
+                response.status_code,
+                response.text,
+            )
+            response.raise_for_status()
+
+    async def close(self) -> None:
+        """
+        Closes the connection pool
+        """
+
+        if self.background_tasks:
+            await asyncio.gather(*self.background_tasks, return_exceptions=True)
+
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+
+
+portal_client = PortalClient()
+
+
+async def get_variable(
+    variable_name: str, default_value: str, max_age: float | None = None
+) -> str:
+    """
+    Gets a variable from the DadLAN WAN Portal
+    """
+
+    return await portal_client.get_variable(variable_name, default_value, max_age)
+
+
+async def get_variables(default_values: Dict[str, str]) -> Dict[str, str]:
+    """
+    Gets several variables from the DadLAN WAN Portal
+    """
+
+    return await portal_client.get_variables(default_values)
+
+
+async def set_variable(variable_name: str, value: str) -> None:
+    """
+    Sets the variable to a specific value
+    """
+
+    await portal_client.set_variable(variable_name, value)
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class CachedVariable(BaseModel):
+
+    value: str
+    fetched_at: float
+    ttl: float
+    etag: str | None = None
@@ -4,9 +4,13 @@ from typing import Any
 import discord
 import pytz
 from config import get_config
+from dadlan.client import portal_client
 from discord import app_commands
 from discord.flags import Intents
 from dpn_pyutils.common import get_logger
+from humanitix.cache import TixSummaryCache
+from humanitix.client import HumanitixClient
+from humanitix.store import TicketStore
 from pruner.client import PrunerClient
 from summariser.client import SummariserClient
 
@@ -28,6 +32,12 @@ class DiscordBotClient(discord.Client):
 
     pruner: PrunerClient
 
+    humanitix: HumanitixClient
+
+    ticket_store: TicketStore
+
+    tix_cache: TixSummaryCache
+
     def __init__(self, *, intents: Intents, **options: Any) -> None:
         """
         Initialize the bot and sync it to a specific guild, so that we don't have to
@@ -37,11 +47,32 @@ class DiscordBotClient(discord.Client):
         self.tree = app_commands.CommandTree(self)
         self.summariser = SummariserClient()
         self.pruner = PrunerClient()
+        self.humanitix = HumanitixClient()
+        self.ticket_store = TicketStore(self.humanitix)
+        self.tix_cache = TixSummaryCache(self.humanitix, self.ticket_store)
 
     async def setup_hook(self):
+        await self.summariser.setup()
         self.tree.copy_global_to(guild=discord.Object(id=config.DISCORD_BOT_GUILD_ID))
         await self.tree.sync(guild=discord.Object(id=config.DISCORD_BOT_GUILD_ID))
 
+    async def close(self):
+        """
+        Flushes buffered work and closes shared connections before disconnecting
+        """
+
+        try:
+            mod_channel = self.get_channel(config.SUMMARISER_MOD_CHANNEL)
+            if mod_channel is not None:
+                await self.summariser.send_mod_digest(mod_channel)  # type: ignore
+        except discord.DiscordException as e:
+            log.error("Could not send the mod digest on shutdown: %s", e)
+
+        await self.summariser.close()
+        await portal_client.close()
+        await self.humanitix.close()
+        await super().close()
+
     async def hydrate_summariser(self):
         """
         Hydrates the summarizer with a range of content
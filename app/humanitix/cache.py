@@ -0,0 +1,153 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Set
+
+from config import get_config
+from dpn_pyutils.common import get_logger
+from humanitix.client import HumanitixClient
+from humanitix.index import EventIndex
+from humanitix.models import Event, Events
+from humanitix.scheduler import PRIORITY_BACKGROUND, request_priority
+from humanitix.store import TicketStore
+from humanitix.summary import assemble_summary, create_summary_events
+
+log = get_logger(__name__)
+
+config = get_config()
+
+
+class TixSummaryCache:
+    """
+    Shared cache of the summary of every live event, so that /tix calls are served from
+    memory. Each call filters the cached set by subnet, and the tickets of events that are
+    not live are only synced when a call names them. Once the cache is older than
+    HUMANITIX_SUMMARY_CACHE_TTL seconds, the cached summary is served while it is rebuilt
+    in the background.
+    """
+
+    client: HumanitixClient
+    store: TicketStore
+    events: List[Event]
+    index: EventIndex
+    summary_events: Dict[str, Dict[str, Any]]
+    refreshed_at: float | None
+    lock: asyncio.Lock
+    background_tasks: Set[asyncio.Task]
+
+    def __init__(self, client: HumanitixClient, store: TicketStore):
+        """
+        Initializes an empty cache
+        """
+
+        self.client = client
+        self.store = store
+        self.events = []
+        self.index = EventIndex([])
+        self.summary_events = {}
+        self.refreshed_at = None
+        self.lock = asyncio.Lock()
+        self.background_tasks = set()
+
+    def is_expired(self) -> bool:
+        """
+        Checks whether the cached summary is missing or older than the TTL
+        """
+
+        return (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at > config.HUMANITIX_SUMMARY_CACHE_TTL
+        )
+
+    async def refresh(self) -> None:
+        """
+        Rebuilds the summary of every live event
+        """
+
+        async with self.lock:
+            # Another caller may have refreshed while this one waited for the lock
+            if not self.is_expired():
+                return
+
+            started_at = time.monotonic()
+            events = Events.model_validate(await self.client.get_all_events()).events
+            index = EventIndex(events)
+            summary_events = await create_summary_events(
+                index.filter(None) or [], self.store
+            )
+
+            self.events = events
+            self.index = index
+            self.summary_events = {s["id"]: s for s in summary_events}
+            self.refreshed_at = time.monotonic()
+
+            log.debug(
+                "Refreshed the summary of %d events in %0.2fs",
+                len(summary_events),
+                self.refreshed_at - started_at,
+            )
+
+    async def refresh_in_background(self) -> None:
+        """
+        Refreshes the cache, logging instead of raising errors. Its requests wait behind
+        interactive requests.
+        """
+
+        # Only set in this task and the tasks it starts
+        request_priority.set(PRIORITY_BACKGROUND)
+
+        try:
+            await self.refresh()
+        except Exception as e:
+            log.error("Could not refresh the tix summary: %s", e)
+
+    def schedule_refresh(self) -> None:
+        """
+        Starts a background refresh if the cache has expired and none is running
+        """
+
+        if self.is_expired() and len(self.background_tasks) == 0:
+            task = asyncio.create_task(self.refresh_in_background())
+            self.background_tasks.add(task)
+            task.add_done_callback(self.background_tasks.discard)
+
+    async def get_summary(self, subnet: str | None = None) -> Dict[str, Any] | None:
+        """
+        Gets the summary of the events matching a subnet name fragment, or of all live
+        events. Returns None if no events match.
+        """
+
+        if self.refreshed_at is None:
+            await self.refresh()
+        else:
+            self.schedule_refresh()
+
+        events = self.index.filter(subnet)
+        if events is None:
+            return None
+
+        # Taken before any await, as a background refresh may replace the cached summaries
+        summary_events = {
+            e.id: self.summary_events[e.id]
+            for e in events
+            if e.id in self.summary_events
+        }
+
+        # Events that are not live can still match by name, and are summarised on demand
+        missing_events = [e for e in events if e.id not in summary_events]
+        if len(missing_events) > 0:
+            for s in await create_summary_events(missing_events, self.store):
+                summary_events[s["id"]] = s
+                self.summary_events[s["id"]] = s
+
+        # Copied so that callers can add to the summary without changing the cache
+        return assemble_summary([dict(summary_events[e.id]) for e in events])
+
+    def get_event_names(self, subnet: str, limit: int = 25) -> List[str]:
+        """
+        Gets the names of the cached live events matching a subnet name fragment. Never
+        calls the API, an empty or expired cache is refreshed in the background.
+        """
+
+        self.schedule_refresh()
+
+        return self.index.complete(subnet, limit)
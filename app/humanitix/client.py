@@ -1,13 +1,24 @@
+import asyncio
+import importlib.util
+import math
+import time
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
 
 import httpx
 from config import get_config
-from humanitix.models import Event, Events
+from dpn_pyutils.common import get_logger
+from humanitix.index import EventIndex
+from humanitix.models import Event, Events, LeanTickets
+from humanitix.scheduler import RequestScheduler
 from humanitix.utils import get_kwargs_as_query_string
 
+log = get_logger(__name__)
+
 config = get_config()
 
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
 
 class HumanitixClient:
     """
@@ -17,12 +28,58 @@ class HumanitixClient:
 
     base_path: str = f"{config.HUMANITIX_API}/v1"
 
+    http_client: httpx.AsyncClient | None
+    scheduler: RequestScheduler
+
     def __init__(self) -> None:
-        pass
+        """
+        Initializes the client, the connection pool is created on first use and shared by
+        every request until the client is closed
+        """
 
-    async def make_api_call(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        self.http_client = None
+        self.scheduler = RequestScheduler()
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        """
+        Gets the shared HTTP client
+        """
+
+        if self.http_client is None or self.http_client.is_closed:
+            http2 = config.HUMANITIX_API_HTTP2
+            if http2 and importlib.util.find_spec("h2") is None:
+                log.warn("HTTP/2 requested for Humanitix but 'h2' is not installed")
+                http2 = False
+
+            self.http_client = httpx.AsyncClient(
+                http2=http2,
+                timeout=httpx.Timeout(config.HUMANITIX_API_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=config.HUMANITIX_API_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.HUMANITIX_API_MAX_CONNECTIONS,
+                ),
+            )
+
+        return self.http_client
+
+    def get_retry_delay(self, response: httpx.Response | None, attempt: int) -> float:
         """
-        Makes a call to the Humanitix API, adding in the necessary headers and API keys
+        Gets how long to wait before retrying, from the Retry-After header if the API sent
+        one, otherwise with exponential backoff
+        """
+
+        if response is not None and "Retry-After" in response.headers:
+            try:
+                return float(response.headers["Retry-After"])
+            except ValueError:
+                pass
+
+        return config.HUMANITIX_API_RETRY_BACKOFF * 2**attempt
+
+    async def send_request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Sends a request to the Humanitix API, adding in the necessary headers and API keys.
+        Rate limited and server error responses and connection errors are retried.
         """
 
         headers = {
@@ -34,12 +91,140 @@ class HumanitixClient:
             headers.update(kwargs["headers"])
             del kwargs["headers"]
 
-        async with httpx.AsyncClient() as client:
-            response = await client.request(
-                method=method, url=f"{self.base_path}/{path}", headers=headers, **kwargs
+        for attempt in range(config.HUMANITIX_API_RETRIES + 1):
+            response = None
+            await self.scheduler.acquire()
+            started_at = time.monotonic()
+            try:
+                response = await self.get_http_client().request(
+                    method=method,
+                    url=f"{self.base_path}/{path}",
+                    headers=headers,
+                    **kwargs,
+                )
+            except httpx.TransportError as e:
+                if attempt == config.HUMANITIX_API_RETRIES:
+                    raise
+
+                log.warn("Humanitix request for '%s' failed, retrying: %s", path, e)
+            finally:
+                if response is not None and response.status_code == 429:
+                    # Every request waits, not just this one. Throttled before the slot
+                    # is released, so that no waiting request starts in the meantime.
+                    self.scheduler.throttle(self.get_retry_delay(response, attempt))
+                self.scheduler.release()
+                self.scheduler.record(
+                    path,
+                    time.monotonic() - started_at,
+                    response.status_code if response is not None else None,
+                )
+
+            if response is not None:
+                if (
+                    response.status_code not in RETRY_STATUS_CODES
+                    or attempt == config.HUMANITIX_API_RETRIES
+                ):
+                    response.raise_for_status()
+                    return response
+
+                log.warn(
+                    "Humanitix returned %s for '%s', retrying",
+                    response.status_code,
+                    path,
+                )
+
+                if response.status_code == 429:
+                    # The scheduler holds the retry back until the Retry-After has passed
+                    continue
+
+            await asyncio.sleep(self.get_retry_delay(response, attempt))
+
+        raise RuntimeError("Unreachable")
+
+    async def make_api_call(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        """
+        Makes a call to the Humanitix API and returns the parsed JSON response
+        """
+
+        response = await self.send_request(method, path, **kwargs)
+
+        return response.json()
+
+    async def make_api_call_bytes(self, method: str, path: str, **kwargs) -> bytes:
+        """
+        Makes a call to the Humanitix API and returns the raw response body
+        """
+
+        response = await self.send_request(method, path, **kwargs)
+
+        return response.content
+
+    async def iterate_pages(
+        self, get_page: Callable[[int], Awaitable[Dict[str, Any]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Iterates over every page of a paginated endpoint, in order. The total from the first
+        page is used to request the remaining pages concurrently, a few at a time.
+        """
+
+        first_page = await get_page(1)
+        yield first_page
+
+        page_count = math.ceil(first_page["total"] / max(first_page["pageSize"], 1))
+        if page_count <= 1:
+            return
+
+        semaphore = asyncio.Semaphore(config.HUMANITIX_API_PAGE_CONCURRENCY)
+
+        async def get_page_limited(page: int) -> Dict[str, Any]:
+            async with semaphore:
+                return await get_page(page)
+
+        tasks = [
+            asyncio.create_task(get_page_limited(page))
+            for page in range(2, page_count + 1)
+        ]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_all_pages(
+        self, get_page: Callable[[int], Awaitable[Dict[str, Any]]], items_key: str
+    ) -> Dict[str, Any]:
+        """
+        Gets every page of a paginated endpoint, combined into a single page
+        """
+
+        items = []
+        total = 0
+        async for page in self.iterate_pages(get_page):
+            items.extend(page[items_key])
+            total = page["total"]
+
+        return {"total": total, "pageSize": len(items), "page": 1, items_key: items}
+
+    async def close(self) -> None:
+        """
+        Closes the connection pool and logs the request stats of each endpoint
+        """
+
+        for endpoint, stats in self.scheduler.stats.items():
+            log.info(
+                "Humanitix %s: %d requests, %d throttled, %d errors, p50 %0.3fs, p95 %0.3fs",
+                endpoint,
+                stats.requests,
+                stats.throttled,
+                stats.errors,
+                stats.get_percentile(50),
+                stats.get_percentile(95),
             )
-            response.raise_for_status()
-            return response.json()
+
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
 
     async def get_events(
         self,
@@ -58,6 +243,20 @@ class HumanitixClient:
 
         return await self.make_api_call("GET", f"events?{url_options}")
 
+    async def get_all_events(
+        self, since: datetime | None = None, inFutureOnly: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Gets all the events from the Humanitix API, across every page
+        """
+
+        return await self.get_all_pages(
+            lambda page: self.get_events(
+                page=page, since=since, inFutureOnly=inFutureOnly
+            ),
+            "events",
+        )
+
     async def get_event(self, event_id: str, overrideLocation: str | None = None):
         """
         Gets the event from the Humanitix API
@@ -121,6 +320,69 @@ class HumanitixClient:
             "GET", f"events/{event_id}/tickets?{url_options}"
         )
 
+    async def get_all_event_tickets(
+        self,
+        event_id: str,
+        event_date_id: str | None = None,
+        status: str = "complete",
+        since: datetime | None = None,
+        lean: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Gets all the event tickets from the Humanitix API, across every page.
+        Lean tickets are returned as LeanTicket models rather than JSON dicts.
+        """
+
+        get_event_tickets = (
+            self.get_event_tickets_lean if lean else self.get_event_tickets
+        )
+
+        return await self.get_all_pages(
+            lambda page: get_event_tickets(
+                event_id,
+                event_date_id=event_date_id,
+                page=page,
+                status=status,
+                since=since,
+            ),
+            "tickets",
+        )
+
+    async def get_event_tickets_lean(
+        self,
+        event_id: str,
+        event_date_id: str | None = None,
+        page: int = 1,
+        page_size: int = 100,
+        status: str = "complete",
+        since: datetime | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Gets the event tickets from the Humanitix API, validated straight from the response
+        bytes onto only the ticket fields the summary uses
+        """
+
+        url_options = get_kwargs_as_query_string(
+            page=page,
+            pageSize=page_size,
+            status=status,
+            since=since,
+            eventDateId=event_date_id,
+        )
+
+        tickets = LeanTickets.model_validate_json(
+            await self.make_api_call_bytes(
+                "GET", f"events/{event_id}/tickets?{url_options}"
+            )
+        )
+
+        return {
+            "total": tickets.total,
+            "pageSize": tickets.pageSize,
+            "page": tickets.page,
+            "tickets": tickets.tickets,
+        }
+
     async def get_event_ticket(self, event_id: str, ticket_id: str):
         """
         Gets the event ticket from the Humanitix API
@@ -128,6 +390,18 @@ class HumanitixClient:
 
         return await self.make_api_call("GET", f"events/{event_id}/tickets/{ticket_id}")
 
+    def filter_events(
+        self,
+        events: List[Event],
+        event_name_fragment: str | None,
+        only_live_events: bool = True,
+    ) -> List[Event] | None:
+        """
+        Filters a list of events by the supplied name fragment
+        """
+
+        return EventIndex(events).filter(event_name_fragment, only_live_events)
+
     async def filter_events_by_name(
         self, event_name_fragment: str | None, only_live_events: bool = True
     ) -> List[Event] | None:
@@ -135,22 +409,6 @@ class HumanitixClient:
         Filters events by the supplied name fragment
         """
 
-        events = Events.model_validate(await self.get_events())
-
-        if event_name_fragment is None and only_live_events is False:
-            return events.events
-        elif event_name_fragment is None:
-            return [
-                event for event in events.events if event.published and event.public
-            ]
-
-        filtered_events = []
-        for event in events.events:
-            if (
-                event_name_fragment.lower() in event.name.lower()
-                or event_name_fragment.lower() in event.slug.lower()
-                and (event.published and event.public)
-            ):
-                filtered_events.append(event)
+        events = Events.model_validate(await self.get_all_events())
 
-        return filtered_events if filtered_events else None
+        return self.filter_events(events.events, event_name_fragment, only_live_events)
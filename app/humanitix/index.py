@@ -0,0 +1,114 @@
+from typing import Dict, List, Set
+
+from humanitix.models import Event
+
+NGRAM_LENGTH = 3
+
+
+def get_trigrams(text: str) -> Set[str]:
+    """
+    Gets the set of three character substrings of a text
+    """
+
+    return {
+        text[idx : idx + NGRAM_LENGTH] for idx in range(len(text) - NGRAM_LENGTH + 1)
+    }
+
+
+class EventIndex:
+    """
+    Trigram index over the names and slugs of a list of events, for name fragment searches
+    without scanning every event
+    """
+
+    events: List[Event]
+    names: List[str]
+    slugs: List[str]
+    live: List[bool]
+    trigrams: Dict[str, Set[int]]
+
+    def __init__(self, events: List[Event]):
+        """
+        Builds the index over a list of events
+        """
+
+        self.events = events
+        self.names = [e.name.lower() for e in events]
+        self.slugs = [e.slug.lower() for e in events]
+        self.live = [e.published and e.public for e in events]
+        self.trigrams = {}
+
+        for idx in range(len(events)):
+            for trigram in get_trigrams(self.names[idx]) | get_trigrams(
+                self.slugs[idx]
+            ):
+                self.trigrams.setdefault(trigram, set()).add(idx)
+
+    def get_candidates(self, fragment: str) -> List[int]:
+        """
+        Gets the positions of the events whose name or slug may contain a lowercase
+        fragment, in event order
+        """
+
+        fragment_trigrams = get_trigrams(fragment)
+        if len(fragment_trigrams) == 0:
+            return list(range(len(self.events)))
+
+        candidates = None
+        for trigram in fragment_trigrams:
+            matches = self.trigrams.get(trigram)
+            if matches is None:
+                return []
+
+            candidates = matches if candidates is None else candidates & matches
+
+        return sorted(candidates)  # type: ignore
+
+    def filter(
+        self, event_name_fragment: str | None, only_live_events: bool = True
+    ) -> List[Event] | None:
+        """
+        Filters the events by a name fragment. Live events matching on name or slug and
+        any event matching on name are returned, or None if no events match.
+        """
+
+        if event_name_fragment is None and only_live_events is False:
+            return self.events
+        elif event_name_fragment is None:
+            return [e for idx, e in enumerate(self.events) if self.live[idx]]
+
+        fragment = event_name_fragment.lower()
+        filtered_events = [
+            self.events[idx]
+            for idx in self.get_candidates(fragment)
+            if fragment in self.names[idx]
+            or fragment in self.slugs[idx]
+            and self.live[idx]
+        ]
+
+        return filtered_events if filtered_events else None
+
+    def complete(self, event_name_fragment: str, limit: int = 25) -> List[str]:
+        """
+        Gets the names of the live events matching a name fragment, names starting with
+        the fragment or with a word starting with it first
+        """
+
+        fragment = event_name_fragment.lower().strip()
+        matches = [
+            idx
+            for idx in self.get_candidates(fragment)
+            if self.live[idx]
+            and (fragment in self.names[idx] or fragment in self.slugs[idx])
+        ]
+
+        def get_rank(idx: int) -> int:
+            if self.names[idx].startswith(fragment):
+                return 0
+            elif f" {fragment}" in self.names[idx]:
+                return 1
+            return 2
+
+        matches.sort(key=get_rank)
+
+        return [self.events[idx].name for idx in matches[:limit]]
@@ -13,7 +13,7 @@ async def apply_maxhealth_info(summary_data: Dict) -> Dict:
     """
 
     max_health_data = json.loads(
-        get_variable(config.RENDER_TIX_MAXHEALTH_VAR_NAME, "{}")
+        await get_variable(config.RENDER_TIX_MAXHEALTH_VAR_NAME, "{}")
     )
 
     for event in summary_data["events"]:
@@ -82,3 +82,27 @@ class Tickets(FlexibleBaseModel):
     pageSize: int
     page: int
     tickets: List[Ticket]
+
+
+class LeanTicketAdditionalDetails(BaseModel):
+
+    questionId: str
+    value: str | None = None
+
+
+class LeanTicket(BaseModel):
+    """
+    Projection of a ticket onto the fields used by the summary, unknown fields are dropped
+    """
+
+    id: str = Field(..., alias="_id")
+    price: float
+    additionalFields: List[LeanTicketAdditionalDetails]
+
+
+class LeanTickets(BaseModel):
+
+    total: int
+    pageSize: int
+    page: int
+    tickets: List[LeanTicket]
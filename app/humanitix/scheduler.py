@@ -0,0 +1,219 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Tuple
+
+from config import get_config
+
+config = get_config()
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# The priority of the Humanitix requests made by the current task and the tasks it starts
+request_priority: ContextVar[int] = ContextVar(
+    "request_priority", default=PRIORITY_INTERACTIVE
+)
+
+
+def get_endpoint_name(path: str) -> str:
+    """
+    Gets the endpoint of a request path, with the ids and query string left out, e.g.
+    'events/{id}/tickets'
+    """
+
+    segments = path.split("?")[0].strip("/").split("/")
+
+    return "/".join(s if idx % 2 == 0 else "{id}" for idx, s in enumerate(segments))
+
+
+class EndpointStats:
+    """
+    Request counts and latencies of one endpoint
+    """
+
+    requests: int
+    throttled: int
+    errors: int
+    latencies: Deque[float]
+
+    def __init__(self, max_samples: int = 1000):
+        """
+        Initializes empty stats, keeping the latencies of the latest requests
+        """
+
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=max_samples)
+
+    def get_percentile(self, percentile: float) -> float:
+        """
+        Gets a latency percentile in seconds over the latest requests
+        """
+
+        if len(self.latencies) == 0:
+            return 0.0
+
+        latencies = sorted(self.latencies)
+        idx = max(math.ceil(percentile / 100 * len(latencies)) - 1, 0)
+
+        return latencies[idx]
+
+
+class RequestScheduler:
+    """
+    Client side limits for Humanitix requests. Requests start at most at the token bucket
+    rate (with bursts of up to the bucket size), only a few are in flight at once, and all
+    requests wait out the Retry-After of a rate limited response. Waiting interactive
+    requests start before waiting background requests.
+    """
+
+    rate: float
+    burst: int
+    max_in_flight: int
+    tokens: float
+    updated_at: float
+    blocked_until: float
+    in_flight: int
+    waiting: List[Tuple[int, int, asyncio.Future]]
+    counter: itertools.count
+    timer: asyncio.TimerHandle | None
+    stats: Dict[str, EndpointStats]
+
+    def __init__(
+        self,
+        rate: float | None = None,
+        burst: int | None = None,
+        max_in_flight: int | None = None,
+    ):
+        """
+        Initializes the scheduler with a full bucket. A rate of 0 is not limited.
+        """
+
+        self.rate = rate if rate is not None else config.HUMANITIX_API_RATE_LIMIT
+        self.burst = burst if burst is not None else config.HUMANITIX_API_RATE_BURST
+        self.max_in_flight = (
+            max_in_flight
+            if max_in_flight is not None
+            else config.HUMANITIX_API_MAX_IN_FLIGHT
+        )
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.waiting = []
+        self.counter = itertools.count()
+        self.timer = None
+        self.stats = {}
+
+    def refill(self, now: float) -> None:
+        """
+        Adds the tokens earned since the last refill
+        """
+
+        if self.rate > 0:
+            self.tokens = min(
+                float(self.burst), self.tokens + (now - self.updated_at) * self.rate
+            )
+        self.updated_at = now
+
+    def get_wait(self, now: float) -> float:
+        """
+        Gets how long until the next request may start
+        """
+
+        if now < self.blocked_until:
+            return self.blocked_until - now
+
+        if self.rate > 0 and self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+
+        return 0.0
+
+    def dispatch(self) -> None:
+        """
+        Starts as many waiting requests as the limits allow, highest priority first
+        """
+
+        self.timer = None
+        now = time.monotonic()
+        self.refill(now)
+
+        while len(self.waiting) > 0 and self.in_flight < self.max_in_flight:
+            wait = self.get_wait(now)
+            if wait > 0:
+                self.timer = asyncio.get_running_loop().call_later(wait, self.dispatch)
+                return
+
+            _, _, future = heapq.heappop(self.waiting)
+            if future.done():
+                # The request was cancelled while it waited
+                continue
+
+            if self.rate > 0:
+                self.tokens -= 1
+            self.in_flight += 1
+            future.set_result(None)
+
+    async def acquire(self) -> None:
+        """
+        Waits until a request at the current task's priority may start
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self.waiting, (request_priority.get(), next(self.counter), future)
+        )
+
+        if self.timer is None:
+            self.dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Started just as it was cancelled, give the slot back
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """
+        Marks a request as finished and starts the next waiting request
+        """
+
+        self.in_flight -= 1
+        if self.timer is None:
+            self.dispatch()
+
+    def throttle(self, delay: float) -> None:
+        """
+        Holds back every request for a delay after a rate limited response
+        """
+
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + delay)
+        self.tokens = 0.0
+        self.updated_at = now
+
+    def record(self, path: str, latency: float, status_code: int | None = None) -> None:
+        """
+        Records the latency and outcome of a request. A status code of None is a
+        connection error.
+        """
+
+        endpoint = get_endpoint_name(path)
+        if endpoint not in self.stats:
+            self.stats[endpoint] = EndpointStats()
+
+        stats = self.stats[endpoint]
+        stats.requests += 1
+        stats.latencies.append(latency)
+        if status_code == 429:
+            stats.throttled += 1
+        elif status_code is None or status_code >= 500:
+            stats.errors += 1
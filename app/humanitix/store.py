@@ -0,0 +1,256 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Set
+
+import pytz
+from config import get_config
+from dpn_pyutils.common import get_logger
+from humanitix.client import HumanitixClient
+from humanitix.models import Event, LeanTicket, Ticket, Tickets
+
+log = get_logger(__name__)
+
+config = get_config()
+
+
+def get_loaner_question_id(event: Event) -> str | None:
+    """
+    Gets the id of the event's loaner laptop question, or None for remote events and
+    events without the question
+    """
+
+    if event.slug.startswith("dadlan-remote"):
+        return None
+
+    return next(
+        (
+            q.id
+            for q in event.additionalQuestions
+            if config.LOANER_LAPTOP_QUESTION in q.question.lower()
+        ),
+        None,
+    )
+
+
+def get_spare_ticket_ids(
+    tickets: Iterable[Ticket | LeanTicket], question_id: str | None
+) -> Set[str]:
+    """
+    Gets the ids of the tickets that answered yes to the loaner laptop question
+    """
+
+    if question_id is None:
+        return set()
+
+    return {
+        t.id
+        for t in tickets
+        for d in t.additionalFields
+        if d.questionId == question_id
+        and d.value is not None
+        and d.value.lower() == "yes"
+    }
+
+
+class EventTickets:
+    """
+    The tickets of one event, with the summary totals kept up to date as tickets are
+    added, changed or removed
+    """
+
+    event_id: str
+    remote_question_id: str | None
+    tickets: Dict[str, Ticket | LeanTicket]
+    spare_ticket_ids: Set[str]
+    orders: int
+    contributions: float
+    spares_needed: int
+    synced_at: datetime | None
+    full_synced_at: datetime | None
+
+    def __init__(self, event: Event):
+        """
+        Initializes an empty ticket set for an event
+        """
+
+        self.event_id = event.id
+        self.remote_question_id = get_loaner_question_id(event)
+        if self.remote_question_id is None and not event.slug.startswith(
+            "dadlan-remote"
+        ):
+            log.warn("Event %s has no loaner laptop question", event.id)
+
+        self.clear()
+
+    def clear(self) -> None:
+        """
+        Removes all tickets and resets the sync cursor
+        """
+
+        self.replace([])
+        self.synced_at = None
+        self.full_synced_at = None
+
+    def replace(self, tickets: List[Ticket | LeanTicket]) -> None:
+        """
+        Replaces all tickets, computing the totals over the whole set at once instead of
+        updating them ticket by ticket
+        """
+
+        self.tickets = {t.id: t for t in tickets}
+        self.spare_ticket_ids = get_spare_ticket_ids(
+            self.tickets.values(), self.remote_question_id
+        )
+        self.orders = len(self.tickets)
+        self.contributions = sum(t.price for t in self.tickets.values())
+        self.spares_needed = len(self.spare_ticket_ids)
+
+    def needs_spare(self, ticket: Ticket | LeanTicket) -> bool:
+        """
+        Checks whether a ticket asked to borrow a laptop
+        """
+
+        return len(get_spare_ticket_ids([ticket], self.remote_question_id)) > 0
+
+    def remove(self, ticket_id: str) -> None:
+        """
+        Removes a ticket, if it is in the set
+        """
+
+        ticket = self.tickets.pop(ticket_id, None)
+        if ticket is None:
+            return
+
+        self.orders -= 1
+        self.contributions -= ticket.price
+        if ticket_id in self.spare_ticket_ids:
+            self.spare_ticket_ids.discard(ticket_id)
+            self.spares_needed -= 1
+
+    def upsert(self, ticket: Ticket | LeanTicket) -> None:
+        """
+        Adds a ticket, replacing the previous version of it
+        """
+
+        self.remove(ticket.id)
+
+        self.tickets[ticket.id] = ticket
+        self.orders += 1
+        self.contributions += ticket.price
+        if self.needs_spare(ticket):
+            self.spare_ticket_ids.add(ticket.id)
+            self.spares_needed += 1
+
+
+class TicketStore:
+    """
+    Local store of the tickets of each event. After the first full download, each sync only
+    fetches the tickets completed or cancelled since the previous sync. A full download is
+    repeated every HUMANITIX_TICKET_FULL_SYNC_INTERVAL seconds to correct any drift.
+    """
+
+    client: HumanitixClient
+    events: Dict[str, EventTickets]
+    locks: Dict[str, asyncio.Lock]
+
+    def __init__(self, client: HumanitixClient):
+        """
+        Initializes an empty store
+        """
+
+        self.client = client
+        self.events = {}
+        self.locks = {}
+
+    async def get_tickets(
+        self,
+        event_id: str,
+        status: str = "complete",
+        since: datetime | None = None,
+    ) -> List[Ticket | LeanTicket]:
+        """
+        Gets every ticket of an event with a status, parsed leanly if
+        HUMANITIX_LEAN_PARSING is enabled
+        """
+
+        if config.HUMANITIX_LEAN_PARSING:
+            return (
+                await self.client.get_all_event_tickets(
+                    event_id, status=status, since=since, lean=True
+                )
+            )["tickets"]
+
+        return Tickets.model_validate(
+            await self.client.get_all_event_tickets(
+                event_id, status=status, since=since
+            )
+        ).tickets
+
+    async def sync_event(self, event: Event) -> EventTickets:
+        """
+        Brings the tickets of an event up to date and returns them
+        """
+
+        if event.id not in self.locks:
+            self.locks[event.id] = asyncio.Lock()
+
+        async with self.locks[event.id]:
+            if event.id not in self.events:
+                self.events[event.id] = EventTickets(event)
+
+            event_tickets = self.events[event.id]
+            sync_started_at = datetime.now(tz=pytz.UTC)
+
+            if event_tickets.full_synced_at is None or (
+                sync_started_at - event_tickets.full_synced_at
+                > timedelta(seconds=config.HUMANITIX_TICKET_FULL_SYNC_INTERVAL)
+            ):
+                await self.full_sync(event_tickets)
+                event_tickets.full_synced_at = sync_started_at
+            else:
+                await self.incremental_sync(event_tickets)
+
+            event_tickets.synced_at = sync_started_at
+
+            return event_tickets
+
+    async def full_sync(self, event_tickets: EventTickets) -> None:
+        """
+        Replaces the tickets of an event with a full download
+        """
+
+        tickets = await self.get_tickets(event_tickets.event_id)
+
+        event_tickets.replace(tickets)
+
+        log.debug(
+            "Downloaded %d tickets for event %s", len(tickets), event_tickets.event_id
+        )
+
+    async def incremental_sync(self, event_tickets: EventTickets) -> None:
+        """
+        Applies the tickets completed or cancelled since the last sync
+        """
+
+        # Overlap the windows a little, applying a ticket twice has no effect
+        since = event_tickets.synced_at - timedelta(  # type: ignore
+            seconds=config.HUMANITIX_TICKET_SYNC_OVERLAP
+        )
+
+        completed, cancelled = await asyncio.gather(
+            self.get_tickets(event_tickets.event_id, status="complete", since=since),
+            self.get_tickets(event_tickets.event_id, status="cancelled", since=since),
+        )
+
+        for t in completed:
+            event_tickets.upsert(t)
+
+        for t in cancelled:
+            event_tickets.remove(t.id)
+
+        log.debug(
+            "Synced %d new and %d cancelled tickets for event %s",
+            len(completed),
+            len(cancelled),
+            event_tickets.event_id,
+        )
@@ -1,68 +1,82 @@
+import asyncio
 from typing import Any, Dict, List
 
 from config import get_config
 from dpn_pyutils.common import get_logger
-from humanitix.client import HumanitixClient
-from humanitix.models import Event, Tickets
+from humanitix.models import Event
+from humanitix.store import TicketStore
 
 log = get_logger(__name__)
 
 config = get_config()
 
 
-async def create_summary_from_event_data(events: List[Event]):
+async def create_summary_event(e: Event, store: TicketStore) -> Dict[str, Any]:
     """
-    Generates a summary data structure from the event data
+    Syncs the tickets of an event and summarises them
+    """
+
+    event_tickets = await store.sync_event(e)
+
+    event_name = str(e.name)
+    try:  # if the event name is not in the expected format
+        event_name = "&nbsp;".join(event_name.split(" ")[1:-2])
+    except IndexError:
+        if config.RENDER_TIX_REPLACE_WORD_FROM_NAME != "":
+            event_name = event_name.replace(
+                config.RENDER_TIX_REPLACE_WORD_FROM_NAME, ""
+            )
+
+    summary_event: Dict[str, Any] = {
+        "id": e.id,
+        "name": event_name,
+        "slug": e.slug,
+        "orders": event_tickets.orders,
+        "public": e.public,
+        "published": e.published,
+    }
+
+    e.contributions = event_tickets.contributions
+    e.sparesNeeded = event_tickets.spares_needed
+
+    if e.slug.startswith("dadlan-remote"):
+        summary_event["isRemote"] = True
+
+    summary_event["contributions"] = e.contributions
+    summary_event["spares_needed"] = e.sparesNeeded
+
+    return summary_event
+
+
+async def create_summary_events(
+    events: List[Event], store: TicketStore
+) -> List[Dict[str, Any]]:
+    """
+    Summarises each event. Events are fetched and summarised concurrently, a few at a time.
     """
 
-    summary_data = []
-    for e in events:
-        client = HumanitixClient()
-        tickets = Tickets.model_validate(await client.get_event_tickets(e.id)).tickets
-
-        event_name = str(e.name)
-        try:  # if the event name is not in the expected format
-            event_name = "&nbsp;".join(event_name.split(" ")[1:-2])
-        except IndexError:
-            if config.RENDER_TIX_REPLACE_WORD_FROM_NAME != "":
-                event_name = event_name.replace(
-                    config.RENDER_TIX_REPLACE_WORD_FROM_NAME, ""
-                )
-
-        summary_event: Dict[str, Any] = {
-            "id": e.id,
-            "name": event_name,
-            "slug": e.slug,
-            "orders": len(tickets),
-            "public": e.public,
-            "published": e.published,
-        }
-
-        e.sparesNeeded = 0
-        e.contributions = sum(t.price for t in tickets)
-
-        if e.slug.startswith("dadlan-remote"):
-            summary_event["isRemote"] = True
-        else:
-            remote_question_id = [
-                q.id
-                for q in e.additionalQuestions
-                if config.LOANER_LAPTOP_QUESTION in q.question.lower()
-            ].pop()
-
-            for t in tickets:
-                for d in t.additionalFields:
-                    if d.questionId == remote_question_id:
-                        if d.value is not None and d.value.lower() == "yes":
-                            e.sparesNeeded += 1
-
-        summary_event["contributions"] = e.contributions
-        summary_event["spares_needed"] = e.sparesNeeded
-
-        summary_data.append(summary_event)
+    semaphore = asyncio.Semaphore(config.HUMANITIX_SUMMARY_CONCURRENCY)
+
+    async def create_summary_event_limited(e: Event) -> Dict[str, Any]:
+        async with semaphore:
+            return await create_summary_event(e, store)
+
+    # gather keeps the results in the order of the events
+    return list(
+        await asyncio.gather(*(create_summary_event_limited(e) for e in events))
+    )
+
+
+def assemble_summary(summary_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Sorts the event summaries and adds the totals
+    """
 
     # Sorting first by name for entries with orders equal to zero
-    summary_data.sort(key=lambda x: (x["orders"] == 0, x["name"] if x["orders"] == 0 else ''), reverse=False)
+    summary_data.sort(
+        key=lambda x: (x["orders"] == 0, x["name"] if x["orders"] == 0 else ""),
+        reverse=False,
+    )
 
     # Sorting again by orders in reverse order, keeping the alphabetical order for entries with zero orders intact
     summary_data.sort(key=lambda x: x["orders"], reverse=True)
@@ -72,3 +86,11 @@ async def create_summary_from_event_data(events: List[Event]):
         "total_orders": sum(event["orders"] for event in summary_data),
         "total_spares_needed": sum(event["spares_needed"] for event in summary_data),
     }
+
+
+async def create_summary_from_event_data(events: List[Event], store: TicketStore):
+    """
+    Generates a summary data structure from the event data
+    """
+
+    return assemble_summary(await create_summary_events(events, store))
@@ -1,3 +1,4 @@
+from datetime import datetime
 from urllib.parse import urlencode
 
 
@@ -12,14 +13,15 @@ def get_kwargs_as_query_string(**kwargs):
     if "page" in kwargs:
         params["page"] = kwargs["page"]
 
-    if "page_size" in kwargs:
-        params["page_size"] = kwargs["page_size"]
+    if "pageSize" in kwargs:
+        params["pageSize"] = kwargs["pageSize"]
 
     if "inFutureOnly" in kwargs:
         params["inFutureOnly"] = str(kwargs["inFutureOnly"]).lower()
 
     if "since" in kwargs and kwargs["since"] is not None:
-        params["since"] = kwargs["since"]
+        since = kwargs["since"]
+        params["since"] = since.isoformat() if isinstance(since, datetime) else since
 
     if "overrideLocation" in kwargs:
         params["overrideLocation"] = kwargs["overrideLocation"]
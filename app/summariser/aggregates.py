@@ -0,0 +1,158 @@
+from datetime import date, datetime
+from typing import Dict, Iterable, Tuple
+
+import pytz
+from summariser.schemas import SpendEntry
+
+MonthKey = Tuple[int, int]
+
+
+def get_month_key(created_at: datetime) -> MonthKey:
+    """
+    Gets the (year, month) key of a time, in UTC like the stored spend history
+    """
+
+    created_at = created_at.astimezone(pytz.UTC)
+
+    return created_at.year, created_at.month
+
+
+def get_day_key(created_at: datetime) -> date:
+    """
+    Gets the day of a time, in UTC like the stored spend history
+    """
+
+    return created_at.astimezone(pytz.UTC).date()
+
+
+class SpendAggregates:
+    """
+    Running monthly spend totals per user and per channel, so that monthly cost lookups
+    take constant time regardless of how long the spend history gets
+    """
+
+    user_costs: Dict[Tuple[MonthKey, int], float]
+    channel_costs: Dict[Tuple[MonthKey, int], float]
+    all_users_costs: Dict[MonthKey, float]
+    all_channels_costs: Dict[MonthKey, float]
+    daily_costs: Dict[date, float]
+
+    def __init__(self):
+        """
+        Initializes empty aggregates
+        """
+
+        self.user_costs = {}
+        self.channel_costs = {}
+        self.all_users_costs = {}
+        self.all_channels_costs = {}
+        self.daily_costs = {}
+
+    def add_cost(
+        self,
+        month: MonthKey,
+        user_id: int | None,
+        channel_id: int | None,
+        cost: float,
+    ) -> None:
+        """
+        Adds a cost to the aggregates of a month
+        """
+
+        if user_id is not None:
+            user_key = (month, user_id)
+            self.user_costs[user_key] = self.user_costs.get(user_key, 0.0) + cost
+            self.all_users_costs[month] = self.all_users_costs.get(month, 0.0) + cost
+
+        if channel_id is not None:
+            channel_key = (month, channel_id)
+            self.channel_costs[channel_key] = (
+                self.channel_costs.get(channel_key, 0.0) + cost
+            )
+            self.all_channels_costs[month] = (
+                self.all_channels_costs.get(month, 0.0) + cost
+            )
+
+    def add(self, entry: SpendEntry) -> None:
+        """
+        Adds a recorded spend entry to the aggregates
+        """
+
+        self.add_cost(
+            get_month_key(entry.created_at), entry.user_id, entry.channel_id, entry.cost
+        )
+
+        day = get_day_key(entry.created_at)
+        self.daily_costs[day] = self.daily_costs.get(day, 0.0) + entry.cost
+
+    def rebuild(
+        self, monthly_costs: Iterable[Tuple[MonthKey, int | None, int | None, float]]
+    ) -> None:
+        """
+        Rebuilds the aggregates from (month, user id, channel id, cost) totals
+        """
+
+        self.user_costs.clear()
+        self.channel_costs.clear()
+        self.all_users_costs.clear()
+        self.all_channels_costs.clear()
+        for month, user_id, channel_id, cost in monthly_costs:
+            self.add_cost(month, user_id, channel_id, cost)
+
+    def rebuild_daily(self, daily_costs: Iterable[Tuple[date, float]]) -> None:
+        """
+        Rebuilds the daily totals from (day, cost) totals
+        """
+
+        self.daily_costs = dict(daily_costs)
+
+    def get_total_cost_month_user(
+        self, user_id: int, month_dt: datetime | None = None
+    ) -> float:
+        """
+        Gets the total cost of tokens spent by a specific user in a month
+        """
+
+        month = get_month_key(month_dt or datetime.now(tz=pytz.UTC))
+
+        return self.user_costs.get((month, user_id), 0.0)
+
+    def get_total_cost_month_channel(
+        self, channel_id: int, month_dt: datetime | None = None
+    ) -> float:
+        """
+        Gets the total cost of tokens spent by a specific channel in a month
+        """
+
+        month = get_month_key(month_dt or datetime.now(tz=pytz.UTC))
+
+        return self.channel_costs.get((month, channel_id), 0.0)
+
+    def get_total_cost_month_all_users(self, month_dt: datetime | None = None) -> float:
+        """
+        Gets the total cost of tokens spent by users in a month
+        """
+
+        month = get_month_key(month_dt or datetime.now(tz=pytz.UTC))
+
+        return self.all_users_costs.get(month, 0.0)
+
+    def get_total_cost_month_all_channels(
+        self, month_dt: datetime | None = None
+    ) -> float:
+        """
+        Gets the total cost of tokens spent by channels in a month
+        """
+
+        month = get_month_key(month_dt or datetime.now(tz=pytz.UTC))
+
+        return self.all_channels_costs.get(month, 0.0)
+
+    def get_total_cost_day(self, day_dt: datetime | None = None) -> float:
+        """
+        Gets the total cost of tokens spent in a day
+        """
+
+        day = get_day_key(day_dt or datetime.now(tz=pytz.UTC))
+
+        return self.daily_costs.get(day, 0.0)
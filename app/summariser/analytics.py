@@ -0,0 +1,155 @@
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pytz
+from summariser.ledger import SpendLedger
+from summariser.schemas import SpendReport, SpendReportItem, SpendReportPeriod
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class SpendColumns:
+    """
+    Columnar view of the spend ledger entries in a time range
+    """
+
+    created_at: np.ndarray
+    user_ids: np.ndarray
+    channel_ids: np.ndarray
+    tokens: np.ndarray
+    costs: np.ndarray
+    requests: np.ndarray
+    counted: np.ndarray
+
+    def __init__(self, columns: Tuple[Tuple, Tuple, Tuple, Tuple, Tuple, Tuple, Tuple]):
+        """
+        Builds the arrays from the ledger columns. Breakdown only rows repeat spend that
+        other rows already count, so they are left out of the counted mask.
+        """
+
+        self.created_at = np.asarray(columns[0], dtype=np.float64)
+        self.user_ids = np.asarray(columns[1], dtype=np.int64)
+        self.channel_ids = np.asarray(columns[2], dtype=np.int64)
+        self.tokens = np.asarray(columns[3], dtype=np.int64)
+        self.costs = np.asarray(columns[4], dtype=np.float64)
+        self.requests = np.asarray(columns[5], dtype=np.int64)
+        self.counted = np.asarray(columns[6], dtype=np.int64) == 0
+
+    def __len__(self) -> int:
+        return len(self.created_at)
+
+
+def get_top_spenders(
+    ids: np.ndarray,
+    columns: SpendColumns,
+    names: Dict[int, str],
+    limit: int,
+) -> List[SpendReportItem]:
+    """
+    Groups the costs by id and returns the highest spenders first.
+    Ids of -1 (no user or channel recorded) are left out.
+    """
+
+    mask = ids >= 0
+    unique_ids, inverse = np.unique(ids[mask], return_inverse=True)
+    if len(unique_ids) == 0:
+        return []
+
+    costs = np.bincount(inverse, weights=columns.costs[mask], minlength=len(unique_ids))
+    tokens = np.bincount(
+        inverse, weights=columns.tokens[mask], minlength=len(unique_ids)
+    )
+    requests = np.bincount(
+        inverse, weights=columns.requests[mask], minlength=len(unique_ids)
+    )
+
+    top = np.argsort(-costs, kind="stable")[:limit]
+
+    return [
+        SpendReportItem(
+            id=int(unique_ids[i]),
+            name=names.get(int(unique_ids[i]), ""),
+            cost=float(costs[i]),
+            tokens=int(tokens[i]),
+            requests=int(requests[i]),
+        )
+        for i in top
+    ]
+
+
+def get_period_costs(
+    columns: SpendColumns, start_dt: datetime, end_dt: datetime, period_days: int
+) -> List[SpendReportPeriod]:
+    """
+    Sums the counted costs and requests into consecutive periods of whole days from the
+    start time
+    """
+
+    period_seconds = period_days * SECONDS_PER_DAY
+    num_periods = max(
+        1, math.ceil((end_dt.timestamp() - start_dt.timestamp()) / period_seconds)
+    )
+
+    counted = columns.counted
+    period_idx = (
+        (columns.created_at[counted] - start_dt.timestamp()) // period_seconds
+    ).astype(np.int64)
+    costs = np.bincount(
+        period_idx, weights=columns.costs[counted], minlength=num_periods
+    )
+    requests = np.bincount(
+        period_idx, weights=columns.requests[counted], minlength=num_periods
+    )
+
+    return [
+        SpendReportPeriod(
+            start_dt=start_dt + timedelta(days=idx * period_days),
+            cost=float(costs[idx]),
+            requests=int(requests[idx]),
+        )
+        for idx in range(num_periods)
+    ]
+
+
+def create_spend_report(
+    ledger: SpendLedger,
+    start_dt: datetime,
+    end_dt: datetime,
+    limit: int = 10,
+    max_periods: int = 31,
+) -> SpendReport:
+    """
+    Creates a spend report over a time range from the ledger: the top users and channels,
+    the cost trend per day (or per several days for long ranges) and the cost per request
+    """
+
+    start_dt = start_dt.astimezone(pytz.UTC)
+    end_dt = end_dt.astimezone(pytz.UTC)
+
+    total_days = max(
+        1, math.ceil((end_dt - start_dt).total_seconds() / SECONDS_PER_DAY)
+    )
+    period_days = math.ceil(total_days / max_periods)
+
+    columns = SpendColumns(ledger.get_columns(start_dt, end_dt))
+    report = SpendReport(start_dt=start_dt, end_dt=end_dt, period_days=period_days)
+    if len(columns) == 0:
+        return report
+
+    user_names, channel_names = ledger.get_latest_names()
+
+    counted = columns.counted
+    report.total_cost = float(columns.costs[counted].sum())
+    report.total_tokens = int(columns.tokens[counted].sum())
+    report.requests = int(columns.requests[counted].sum())
+    if report.requests > 0:
+        report.cost_per_request = report.total_cost / report.requests
+    report.top_users = get_top_spenders(columns.user_ids, columns, user_names, limit)
+    report.top_channels = get_top_spenders(
+        columns.channel_ids, columns, channel_names, limit
+    )
+    report.periods = get_period_costs(columns, start_dt, end_dt, period_days)
+
+    return report
@@ -0,0 +1,201 @@
+import re
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from dpn_pyutils.common import get_logger
+from summariser.messages import estimate_tokens
+from summariser.schemas import ChatMessage
+
+log = get_logger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9']+")
+
+# Small English stop word list, IDF handles the long tail of common words
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have i if in is it its me my of on or "
+    "so that the this to was we were what when with you your just like im dont "
+    "they them he she his her our us do did not no yes can will would".split()
+)
+
+DAMPING_FACTOR = 0.85
+MAX_ITERATIONS = 50
+CONVERGENCE_TOLERANCE = 1e-6
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a message into lowercase terms, dropping stop words
+    """
+
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def build_tfidf_matrix(
+    texts: List[str],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Builds a sparse, L2-normalised TF-IDF matrix in coordinate form.
+    Returns the (rows, cols, values) arrays and the vocabulary size.
+    """
+
+    vocabulary: Dict[str, int] = {}
+    row_ids: List[int] = []
+    col_ids: List[int] = []
+    for idx, text in enumerate(texts):
+        terms = [vocabulary.setdefault(t, len(vocabulary)) for t in tokenize(text)]
+        row_ids.extend([idx] * len(terms))
+        col_ids.extend(terms)
+
+    num_terms = len(vocabulary)
+    if num_terms == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float64), 0
+
+    # Collapse repeated (message, term) pairs into a single entry with its term count
+    keys = np.asarray(row_ids, dtype=np.int64) * num_terms + np.asarray(
+        col_ids, dtype=np.int64
+    )
+    unique_keys, counts = np.unique(keys, return_counts=True)
+    rows = unique_keys // num_terms
+    cols = unique_keys % num_terms
+
+    document_frequency = np.bincount(cols, minlength=num_terms)
+    idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1.0
+    values = (1.0 + np.log(counts)) * idf[cols]
+
+    norms = np.sqrt(np.bincount(rows, weights=values**2, minlength=len(texts)))
+    values = values / norms[rows]
+
+    return rows, cols, values, num_terms
+
+
+def score_messages(
+    texts: List[str],
+    replies: np.ndarray | None = None,
+    reactions: np.ndarray | None = None,
+    damping: float = DAMPING_FACTOR,
+) -> np.ndarray:
+    """
+    Scores messages with a personalised TextRank over TF-IDF cosine similarity.
+
+    The similarity graph W = S @ S.T is never materialised, each power iteration applies
+    it as two sparse products over the non-zero entries of S, so the cost is linear in
+    the total number of terms rather than quadratic in the number of messages.
+    Engagement (replies and reactions) biases the teleport vector towards messages that
+    people responded to.
+    """
+
+    num_messages = len(texts)
+    if num_messages == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    rows, cols, values, num_terms = build_tfidf_matrix(texts)
+    self_similarity = np.bincount(rows, weights=values**2, minlength=num_messages)
+
+    def similarity_product(x: np.ndarray) -> np.ndarray:
+        # (S @ S.T - diag) @ x, without self-similarity
+        term_weights = np.bincount(cols, weights=values * x[rows], minlength=num_terms)
+        return (
+            np.bincount(
+                rows, weights=values * term_weights[cols], minlength=num_messages
+            )
+            - self_similarity * x
+        )
+
+    degree = similarity_product(np.ones(num_messages))
+    has_edges = degree > 1e-12
+    inverse_degree = np.divide(1.0, degree, out=np.zeros(num_messages), where=has_edges)
+
+    engagement = np.ones(num_messages)
+    if replies is not None:
+        engagement += np.log1p(np.asarray(replies, dtype=np.float64))
+    if reactions is not None:
+        engagement += np.log1p(np.asarray(reactions, dtype=np.float64))
+    teleport = engagement / engagement.sum()
+
+    scores = teleport.copy()
+    for _ in range(MAX_ITERATIONS):
+        # Rank held by messages without any similar messages is redistributed via teleport
+        dangling_mass = scores[~has_edges].sum()
+        updated = (1.0 - damping + damping * dangling_mass) * teleport + (
+            damping * similarity_product(scores * inverse_degree)
+        )
+        if np.abs(updated - scores).sum() < CONVERGENCE_TOLERANCE:
+            scores = updated
+            break
+        scores = updated
+
+    return scores
+
+
+def count_replies(messages: List[ChatMessage]) -> np.ndarray:
+    """
+    Counts how many of the supplied messages reply to each message
+    """
+
+    index_by_id = {m.id: idx for idx, m in enumerate(messages)}
+    replied_indices = [
+        index_by_id[m.reply_to_id]
+        for m in messages
+        if m.reply_to_id is not None and m.reply_to_id in index_by_id
+    ]
+
+    return np.bincount(
+        np.asarray(replied_indices, dtype=np.int64), minlength=len(messages)
+    )
+
+
+def get_message_text(message: ChatMessage) -> str:
+    """
+    Gets the display name and text of a message
+    """
+
+    return f"{message.display_name}: {message.message}"
+
+
+def select_messages(
+    messages: List[ChatMessage],
+    token_budget: int,
+    format_message: Callable[[ChatMessage], str] = get_message_text,
+) -> List[ChatMessage]:
+    """
+    Selects the highest scoring messages that fit within the token budget,
+    returned in chronological order. Messages are measured as formatted for the prompt,
+    by default as the display name and message.
+    """
+
+    if len(messages) == 0:
+        return []
+
+    messages = sorted(messages, key=lambda x: x.created_at)
+    message_tokens = np.fromiter(
+        (estimate_tokens(format_message(m)) for m in messages),
+        dtype=np.int64,
+        count=len(messages),
+    )
+    if message_tokens.sum() <= token_budget:
+        return messages
+
+    scores = score_messages(
+        [m.message for m in messages],
+        replies=count_replies(messages),
+        reactions=np.fromiter(
+            (m.reactions for m in messages), dtype=np.int64, count=len(messages)
+        ),
+    )
+
+    ranked = np.argsort(-scores, kind="stable")
+    # A single message larger than the whole budget would otherwise block everything below it
+    ranked = ranked[message_tokens[ranked] <= token_budget]
+    within_budget = ranked[np.cumsum(message_tokens[ranked]) <= token_budget]
+    selected = np.sort(within_budget)
+
+    log.debug(
+        "Selected %d of %d messages (%d of %d estimated tokens)",
+        len(selected),
+        len(messages),
+        message_tokens[selected].sum(),
+        message_tokens.sum(),
+    )
+
+    return [messages[idx] for idx in selected]
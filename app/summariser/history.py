@@ -0,0 +1,124 @@
+import base64
+import json
+import zlib
+from datetime import datetime
+from typing import Dict, Tuple
+
+import pytz
+from dpn_pyutils.common import get_logger
+from summariser.schemas import TokenChannelMonthly, TokenHistory, TokenUserMonthly
+
+log = get_logger(__name__)
+
+COMPRESSED_PREFIX = "zlib:"
+
+
+def compact_token_history(
+    token_history: TokenHistory, now: datetime | None = None
+) -> TokenHistory:
+    """
+    Rolls the individual requests of closed months up into per-user and per-channel
+    monthly buckets, keeping raw entries only for the current month
+    """
+
+    if now is None:
+        now = datetime.now(tz=pytz.UTC)
+
+    current_month = (now.year, now.month)
+
+    user_buckets: Dict[Tuple[int, int, int], TokenUserMonthly] = {
+        (b.year, b.month, b.id): b for b in token_history.user_monthly
+    }
+    channel_buckets: Dict[Tuple[int, int, int], TokenChannelMonthly] = {
+        (b.year, b.month, b.id): b for b in token_history.channel_monthly
+    }
+
+    user_history = []
+    for user in token_history.user_history:
+        month = (user.created_at.year, user.created_at.month)
+        if month >= current_month:
+            user_history.append(user)
+            continue
+
+        key = (*month, user.id)
+        if key not in user_buckets:
+            user_buckets[key] = TokenUserMonthly(
+                id=user.id,
+                name=user.name,
+                display_name=user.display_name,
+                year=month[0],
+                month=month[1],
+            )
+
+        bucket = user_buckets[key]
+        bucket.tokens += user.tokens
+        bucket.cached_tokens += user.cached_tokens
+        bucket.cost += user.cost
+        bucket.requests += 1
+
+    channel_history = []
+    for channel in token_history.channel_history:
+        month = (channel.created_at.year, channel.created_at.month)
+        if month >= current_month:
+            channel_history.append(channel)
+            continue
+
+        key = (*month, channel.id)
+        if key not in channel_buckets:
+            channel_buckets[key] = TokenChannelMonthly(
+                id=channel.id,
+                name=channel.name,
+                year=month[0],
+                month=month[1],
+            )
+
+        bucket = channel_buckets[key]
+        bucket.tokens += channel.tokens
+        bucket.cached_tokens += channel.cached_tokens
+        bucket.cost += channel.cost
+        bucket.requests += 1
+
+    rolled_up = len(token_history.user_history) - len(user_history)
+    if rolled_up > 0:
+        log.info("Rolled %d spend history requests up into monthly buckets", rolled_up)
+
+    return TokenHistory(
+        total_tokens=token_history.total_tokens,
+        total_cached_tokens=token_history.total_cached_tokens,
+        total_cost=token_history.total_cost,
+        user_history=user_history,
+        channel_history=channel_history,
+        user_monthly=sorted(
+            user_buckets.values(), key=lambda b: (b.year, b.month, b.id)
+        ),
+        channel_monthly=sorted(
+            channel_buckets.values(), key=lambda b: (b.year, b.month, b.id)
+        ),
+    )
+
+
+def dump_token_history(token_history: TokenHistory, compress: bool = False) -> str:
+    """
+    Serialises the token history, optionally as compressed base64 text
+    """
+
+    serialised = token_history.model_dump_json()
+    if not compress:
+        return serialised
+
+    compressed = zlib.compress(serialised.encode("utf-8"), level=9)
+
+    return COMPRESSED_PREFIX + base64.b64encode(compressed).decode("ascii")
+
+
+def load_token_history_value(value: str) -> TokenHistory:
+    """
+    Parses a serialised token history, compressed or not
+    """
+
+    if value.startswith(COMPRESSED_PREFIX):
+        value = zlib.decompress(
+            base64.b64decode(value[len(COMPRESSED_PREFIX) :])
+        ).decode("utf-8")
+
+    return TokenHistory.model_validate(json.loads(value))
@@ -0,0 +1,363 @@
+import sqlite3
+from datetime import date, datetime
+from itertools import zip_longest
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import pytz
+from dpn_pyutils.common import get_logger
+from summariser.schemas import (
+    SpendEntry,
+    TokenChannelHistory,
+    TokenHistory,
+    TokenUserHistory,
+)
+
+log = get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spend (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    user_id INTEGER,
+    user_name TEXT,
+    user_display_name TEXT,
+    channel_id INTEGER,
+    channel_name TEXT,
+    tokens INTEGER NOT NULL,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 1,
+    breakdown_only INTEGER NOT NULL DEFAULT 0,
+    synced INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS spend_created_at ON spend (created_at);
+CREATE INDEX IF NOT EXISTS spend_unsynced ON spend (id) WHERE synced = 0;
+"""
+
+COLUMNS = (
+    "created_at, user_id, user_name, user_display_name, channel_id, channel_name, "
+    "tokens, cached_tokens, cost, requests, breakdown_only"
+)
+
+# Columns added since the ledger was first released, with their definitions
+ADDED_COLUMNS = {
+    "requests": "INTEGER NOT NULL DEFAULT 1",
+    "breakdown_only": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+class SpendLedger:
+    """
+    Append-only local ledger of GenAI spend, stored in SQLite.
+    Each row is one request, attributed to a user and a channel, or a monthly bucket of
+    several requests imported from a compacted portal history. Rows are marked as synced
+    once they have been copied to the portal spend history.
+    """
+
+    connection: sqlite3.Connection
+
+    def __init__(self, ledger_file: Path):
+        """
+        Opens (and creates if needed) the ledger database
+        """
+
+        self.connection = sqlite3.connect(ledger_file)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.add_missing_columns()
+
+    def add_missing_columns(self) -> None:
+        """
+        Adds the columns that a ledger created by an earlier version is missing
+        """
+
+        existing = {
+            r[1] for r in self.connection.execute("PRAGMA table_info(spend)").fetchall()
+        }
+        with self.connection:
+            for name, definition in ADDED_COLUMNS.items():
+                if name not in existing:
+                    self.connection.execute(
+                        f"ALTER TABLE spend ADD COLUMN {name} {definition}"
+                    )
+
+    def close(self) -> None:
+        """
+        Closes the ledger database
+        """
+
+        self.connection.close()
+
+    def entry_to_row(self, entry: SpendEntry, synced: bool = False) -> Tuple:
+        """
+        Converts a spend entry into a database row
+        """
+
+        return (
+            entry.created_at.timestamp(),
+            entry.user_id,
+            entry.user_name,
+            entry.user_display_name,
+            entry.channel_id,
+            entry.channel_name,
+            entry.tokens,
+            entry.cached_tokens,
+            entry.cost,
+            entry.requests,
+            int(entry.breakdown_only),
+            int(synced),
+        )
+
+    def row_to_entry(self, row: Tuple) -> SpendEntry:
+        """
+        Converts a database row into a spend entry
+        """
+
+        return SpendEntry(
+            created_at=datetime.fromtimestamp(row[0], tz=pytz.UTC),
+            user_id=row[1],
+            user_name=row[2],
+            user_display_name=row[3],
+            channel_id=row[4],
+            channel_name=row[5],
+            tokens=row[6],
+            cached_tokens=row[7],
+            cost=row[8],
+            requests=row[9],
+            breakdown_only=bool(row[10]),
+        )
+
+    def append(self, entry: SpendEntry) -> None:
+        """
+        Appends a single spend entry to the ledger
+        """
+
+        self.append_many([entry])
+
+    def append_many(self, entries: Iterable[SpendEntry], synced: bool = False) -> None:
+        """
+        Appends several spend entries to the ledger in a single transaction
+        """
+
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO spend ({COLUMNS}, synced) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self.entry_to_row(e, synced) for e in entries],
+            )
+
+    def is_empty(self) -> bool:
+        """
+        Checks whether the ledger has any entries
+        """
+
+        return self.connection.execute("SELECT 1 FROM spend LIMIT 1").fetchone() is None
+
+    def get_entries(
+        self, start_dt: datetime | None = None, end_dt: datetime | None = None
+    ) -> List[SpendEntry]:
+        """
+        Gets the ledger entries within an optional time range, oldest first
+        """
+
+        start_ts = start_dt.timestamp() if start_dt is not None else float("-inf")
+        end_ts = end_dt.timestamp() if end_dt is not None else float("inf")
+        rows = self.connection.execute(
+            f"SELECT {COLUMNS} FROM spend WHERE created_at >= ? AND created_at < ? ORDER BY id",
+            (start_ts, end_ts),
+        ).fetchall()
+
+        return [self.row_to_entry(r) for r in rows]
+
+    def get_columns(
+        self, start_dt: datetime, end_dt: datetime
+    ) -> Tuple[Tuple, Tuple, Tuple, Tuple, Tuple, Tuple, Tuple]:
+        """
+        Gets the created at, user id, channel id, tokens, cost, requests and breakdown only
+        columns of the entries in a time range. Missing user and channel ids are returned
+        as -1.
+        """
+
+        rows = self.connection.execute(
+            "SELECT created_at, COALESCE(user_id, -1), COALESCE(channel_id, -1), tokens, "
+            "cost, requests, breakdown_only "
+            "FROM spend WHERE created_at >= ? AND created_at < ?",
+            (start_dt.timestamp(), end_dt.timestamp()),
+        ).fetchall()
+
+        # Built per column so that an empty range still gives a full set of empty columns
+        return tuple(tuple(r[idx] for r in rows) for idx in range(7))  # type: ignore
+
+    def get_latest_names(self) -> Tuple[Dict[int, str], Dict[int, str]]:
+        """
+        Gets the most recently recorded name of each user and channel
+        """
+
+        user_rows = self.connection.execute(
+            "SELECT user_id, COALESCE(user_display_name, user_name), MAX(id) FROM spend "
+            "WHERE user_id IS NOT NULL GROUP BY user_id"
+        ).fetchall()
+        channel_rows = self.connection.execute(
+            "SELECT channel_id, channel_name, MAX(id) FROM spend "
+            "WHERE channel_id IS NOT NULL GROUP BY channel_id"
+        ).fetchall()
+
+        return (
+            {r[0]: r[1] or "" for r in user_rows},
+            {r[0]: r[1] or "" for r in channel_rows},
+        )
+
+    def get_monthly_costs(
+        self,
+    ) -> List[Tuple[Tuple[int, int], int | None, int | None, float]]:
+        """
+        Gets the total cost per (year, month), user and channel, in UTC
+        """
+
+        rows = self.connection.execute(
+            "SELECT CAST(strftime('%Y', created_at, 'unixepoch') AS INTEGER), "
+            "CAST(strftime('%m', created_at, 'unixepoch') AS INTEGER), "
+            "user_id, channel_id, SUM(cost) FROM spend GROUP BY 1, 2, 3, 4"
+        ).fetchall()
+
+        return [((r[0], r[1]), r[2], r[3], r[4]) for r in rows]
+
+    def get_daily_costs(self, start_dt: datetime) -> List[Tuple[date, float]]:
+        """
+        Gets the total cost per day since a time, in UTC
+        """
+
+        rows = self.connection.execute(
+            "SELECT date(created_at, 'unixepoch'), SUM(cost) FROM spend "
+            "WHERE created_at >= ? AND breakdown_only = 0 GROUP BY 1",
+            (start_dt.timestamp(),),
+        ).fetchall()
+
+        return [(date.fromisoformat(r[0]), r[1]) for r in rows]
+
+    def get_unsynced(self) -> List[Tuple[int, SpendEntry]]:
+        """
+        Gets the entries that have not been copied to the portal yet
+        """
+
+        rows = self.connection.execute(
+            f"SELECT id, {COLUMNS} FROM spend WHERE synced = 0 ORDER BY id"
+        ).fetchall()
+
+        return [(r[0], self.row_to_entry(r[1:])) for r in rows]
+
+    def mark_synced(self, entry_ids: List[int]) -> None:
+        """
+        Marks entries as copied to the portal
+        """
+
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE spend SET synced = 1 WHERE id = ?", [(i,) for i in entry_ids]
+            )
+
+    def import_token_history(self, token_history: TokenHistory) -> int:
+        """
+        Imports an existing portal token history into the ledger, already marked as synced.
+        User and channel records were always appended in pairs, so they are paired back up.
+        Rolled up months are imported as one user-only entry per user bucket, carrying the
+        bucket's request count, and one channel-only entry per channel bucket that only
+        counts towards the channel breakdowns, as it repeats the spend of the user buckets.
+        """
+
+        entries = []
+        for user, channel in zip_longest(
+            token_history.user_history, token_history.channel_history
+        ):
+            record = user if user is not None else channel
+            entries.append(
+                SpendEntry(
+                    created_at=record.created_at,
+                    user_id=user.id if user is not None else None,
+                    user_name=user.name if user is not None else None,
+                    user_display_name=user.display_name if user is not None else None,
+                    channel_id=channel.id if channel is not None else None,
+                    channel_name=channel.name if channel is not None else None,
+                    tokens=record.tokens,
+                    cached_tokens=record.cached_tokens,
+                    cost=record.cost,
+                )
+            )
+
+        for user_bucket in token_history.user_monthly:
+            entries.append(
+                SpendEntry(
+                    created_at=datetime(
+                        user_bucket.year, user_bucket.month, 1, tzinfo=pytz.UTC
+                    ),
+                    user_id=user_bucket.id,
+                    user_name=user_bucket.name,
+                    user_display_name=user_bucket.display_name,
+                    tokens=user_bucket.tokens,
+                    cached_tokens=user_bucket.cached_tokens,
+                    cost=user_bucket.cost,
+                    requests=user_bucket.requests,
+                )
+            )
+
+        for channel_bucket in token_history.channel_monthly:
+            entries.append(
+                SpendEntry(
+                    created_at=datetime(
+                        channel_bucket.year, channel_bucket.month, 1, tzinfo=pytz.UTC
+                    ),
+                    channel_id=channel_bucket.id,
+                    channel_name=channel_bucket.name,
+                    tokens=channel_bucket.tokens,
+                    cached_tokens=channel_bucket.cached_tokens,
+                    cost=channel_bucket.cost,
+                    requests=channel_bucket.requests,
+                    breakdown_only=True,
+                )
+            )
+
+        self.append_many(entries, synced=True)
+        log.info("Imported %d spend history records into the ledger", len(entries))
+
+        return len(entries)
+
+
+def apply_entries_to_token_history(
+    token_history: TokenHistory, entries: List[SpendEntry]
+) -> TokenHistory:
+    """
+    Appends ledger entries to a portal token history
+    """
+
+    for entry in entries:
+        token_history.total_tokens += entry.tokens
+        token_history.total_cached_tokens += entry.cached_tokens
+        token_history.total_cost += entry.cost
+
+        if entry.user_id is not None:
+            token_history.user_history.append(
+                TokenUserHistory(
+                    id=entry.user_id,
+                    name=entry.user_name or "",
+                    display_name=entry.user_display_name or "",
+                    tokens=entry.tokens,
+                    cached_tokens=entry.cached_tokens,
+                    cost=entry.cost,
+                    created_at=entry.created_at,
+                )
+            )
+
+        if entry.channel_id is not None:
+            token_history.channel_history.append(
+                TokenChannelHistory(
+                    id=entry.channel_id,
+                    name=entry.channel_name or "",
+                    tokens=entry.tokens,
+                    cached_tokens=entry.cached_tokens,
+                    cost=entry.cost,
+                    created_at=entry.created_at,
+                )
+            )
+
+    return token_history
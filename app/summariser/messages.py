@@ -6,6 +6,10 @@ from tokencost import count_message_tokens
 
 log = get_logger(__name__)
 
+# Rough averages for English chat text, used where an exact tokenizer count is too slow
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+
 
 def format_messages_for_summary(messages: List[Dict]) -> str:
     """
@@ -36,3 +40,11 @@ def num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613") -> int:
     log.debug("Prompt estimated token cost: %s", prompt_cost)
 
     return prompt_cost
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Quickly estimates the number of prompt tokens a single chat message will use
+    """
+
+    return TOKENS_PER_MESSAGE + (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
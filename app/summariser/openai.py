@@ -1,9 +1,13 @@
-from typing import Dict, List
+import time
+from typing import Dict, List, Tuple
 
 from config import get_config
+from dpn_pyutils.common import get_logger
 from openai import OpenAI
-from summariser.messages import num_tokens_from_messages
-from summariser.schemas import OpenAIResponse
+from summariser.messages import estimate_tokens, num_tokens_from_messages
+from summariser.schemas import OpenAIResponse, SummaryRoute
+
+log = get_logger(__name__)
 
 config = get_config()
 
@@ -25,27 +29,38 @@ class ChatGPTClient:
         prompt: List[Dict],
         max_tokens: int = 150,
         temperature: float = 0.7,
+        model: str | None = None,
     ) -> OpenAIResponse:
         """
         Calls the API with the supplied prompt and returns the response text.
         """
 
+        started_at = time.perf_counter()
         response = self.client.chat.completions.create(
-            model=self.model,
+            model=model or self.model,
             messages=prompt,  # type: ignore
             max_tokens=max_tokens,
             temperature=temperature,
         )
+        duration = time.perf_counter() - started_at
 
         total_tokens = 0
         completion_tokens = 0
         prompt_tokens = 0
+        cached_prompt_tokens = 0
 
         if response.usage is not None:
             total_tokens = response.usage.total_tokens
             completion_tokens = response.usage.completion_tokens
             prompt_tokens = response.usage.prompt_tokens
 
+            # Only reported by newer API versions, and only when the prompt prefix was cached
+            prompt_tokens_details = getattr(
+                response.usage, "prompt_tokens_details", None
+            )
+            if prompt_tokens_details is not None:
+                cached_prompt_tokens = prompt_tokens_details.cached_tokens or 0
+
         response_content = ""
         if (
             response.choices is not None
@@ -59,8 +74,140 @@ class ChatGPTClient:
             total_tokens=total_tokens,
             completion_tokens=completion_tokens,
             prompt_tokens=prompt_tokens,
+            cached_prompt_tokens=cached_prompt_tokens,
+            duration=duration,
+        )
+
+    def calculate_cost(
+        self, total_tokens: int, cached_tokens: int = 0, token_cost: float | None = None
+    ) -> float:
+        """
+        Calculates the cost of a request, billing cached prompt tokens at the discounted rate
+        """
+
+        if token_cost is None:
+            token_cost = config.OPENAI_TOKEN_COST
+
+        uncached_tokens = total_tokens - cached_tokens
+        cached_token_cost = token_cost * config.OPENAI_CACHED_TOKEN_COST_FACTOR
+
+        return uncached_tokens * token_cost + cached_tokens * cached_token_cost
+
+    def estimate_prompt_tokens(self, prompt: List[Dict], model: str) -> int:
+        """
+        Estimates the prompt tokens, falling back to a character based estimate for models
+        the tokenizer does not know about or when its encodings cannot be loaded
+        """
+
+        try:
+            return self.estimate_token_cost(prompt, model)
+        except Exception as e:
+            log.warn("Using approximate token estimate for model '%s': %s", model, e)
+            return sum(estimate_tokens(p["content"]) for p in prompt)
+
+    def route(
+        self,
+        prompt: List[Dict],
+        period_hours: float,
+        default_model: str,
+        default_max_tokens: int,
+    ) -> SummaryRoute:
+        """
+        Picks the model and output token budget for a prompt based on its estimated size
+        and the length of the time window it covers
+        """
+
+        estimated_prompt_tokens = self.estimate_prompt_tokens(prompt, default_model)
+
+        selected_route = SummaryRoute(
+            name="default",
+            model=default_model,
+            max_tokens=default_max_tokens,
+            token_cost=config.OPENAI_TOKEN_COST,
+            estimated_prompt_tokens=estimated_prompt_tokens,
+        )
+        for route in config.SUMMARISER_MODEL_ROUTES:
+            if estimated_prompt_tokens > route.max_prompt_tokens:
+                continue
+            if (
+                route.max_period_hours is not None
+                and period_hours > route.max_period_hours
+            ):
+                continue
+
+            selected_route = SummaryRoute(
+                name=route.name,
+                model=route.model,
+                max_tokens=route.max_tokens,
+                token_cost=(
+                    route.token_cost
+                    if route.token_cost is not None
+                    else config.OPENAI_TOKEN_COST
+                ),
+                estimated_prompt_tokens=estimated_prompt_tokens,
+            )
+            break
+
+        # Scale the output budget with the amount of conversation being summarised
+        adaptive_max_tokens = int(
+            estimated_prompt_tokens * config.SUMMARISER_OUTPUT_TOKEN_RATIO
+        )
+        selected_route.max_tokens = max(
+            min(config.SUMMARISER_MIN_OUTPUT_TOKENS, selected_route.max_tokens),
+            min(adaptive_max_tokens, selected_route.max_tokens),
         )
 
+        log.debug(
+            "Routing %d estimated prompt tokens over %s hours to '%s' (%s, max tokens %d)",
+            estimated_prompt_tokens,
+            period_hours,
+            selected_route.name,
+            selected_route.model,
+            selected_route.max_tokens,
+        )
+
+        return selected_route
+
+    def estimate_route_cost(self, route: SummaryRoute) -> float:
+        """
+        Estimates the most a routed request can cost, assuming no cached prompt tokens and
+        a completion of the full max tokens
+        """
+
+        return self.calculate_cost(
+            route.estimated_prompt_tokens + route.max_tokens, 0, route.token_cost
+        )
+
+    def get_cheapest_route(
+        self, route: SummaryRoute
+    ) -> Tuple[SummaryRoute, int | None]:
+        """
+        Gets the configured route with the lowest token cost, or the given route if none is
+        cheaper, along with the largest prompt the route accepts
+        """
+
+        cheapest_route = route
+        max_prompt_tokens = None
+        for config_route in config.SUMMARISER_MODEL_ROUTES:
+            token_cost = (
+                config_route.token_cost
+                if config_route.token_cost is not None
+                else config.OPENAI_TOKEN_COST
+            )
+            if token_cost >= cheapest_route.token_cost:
+                continue
+
+            cheapest_route = SummaryRoute(
+                name=config_route.name,
+                model=config_route.model,
+                max_tokens=min(config_route.max_tokens, route.max_tokens),
+                token_cost=token_cost,
+                estimated_prompt_tokens=route.estimated_prompt_tokens,
+            )
+            max_prompt_tokens = config_route.max_prompt_tokens
+
+        return cheapest_route, max_prompt_tokens
+
     def estimate_token_cost(self, prompt: List[Dict], model: str) -> int:
         """
         Estimates the token cost of a prompt
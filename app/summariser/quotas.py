@@ -0,0 +1,77 @@
+import math
+import sys
+from typing import Tuple
+
+from config import get_config
+from summariser.aggregates import SpendAggregates
+
+config = get_config()
+
+
+class SpendQuotas:
+    """
+    Checks spend against the configured per-user and per-channel monthly quotas and the
+    daily quota for all spend. A quota of 0 is not enforced.
+    """
+
+    aggregates: SpendAggregates
+
+    def __init__(self, aggregates: SpendAggregates):
+        """
+        Initializes the quotas over the running spend aggregates
+        """
+
+        self.aggregates = aggregates
+
+    def get_remaining_budget(self, user_id: int, channel_id: int) -> Tuple[float, str]:
+        """
+        Gets the smallest budget left across the quotas that apply to a request, and the
+        name of the quota it comes from
+        """
+
+        remaining = (math.inf, "")
+
+        if config.SUMMARISER_QUOTA_USER_MONTHLY > 0:
+            user_remaining = (
+                config.SUMMARISER_QUOTA_USER_MONTHLY
+                - self.aggregates.get_total_cost_month_user(user_id)
+            )
+            remaining = min(remaining, (user_remaining, "your monthly"))
+
+        if config.SUMMARISER_QUOTA_CHANNEL_MONTHLY > 0:
+            channel_remaining = (
+                config.SUMMARISER_QUOTA_CHANNEL_MONTHLY
+                - self.aggregates.get_total_cost_month_channel(channel_id)
+            )
+            remaining = min(remaining, (channel_remaining, "this channel's monthly"))
+
+        if config.SUMMARISER_QUOTA_DAILY > 0:
+            daily_remaining = (
+                config.SUMMARISER_QUOTA_DAILY - self.aggregates.get_total_cost_day()
+            )
+            remaining = min(remaining, (daily_remaining, "the daily"))
+
+        return max(remaining[0], 0.0), remaining[1]
+
+    def get_affordable_prompt_tokens(
+        self,
+        remaining_budget: float,
+        max_tokens: int,
+        token_cost: float,
+        max_prompt_tokens: int | None = None,
+    ) -> int:
+        """
+        Gets the number of prompt tokens a budget pays for, leaving room for the completion,
+        up to the route's prompt limit. A route without a token cost is not limited by the
+        budget.
+        """
+
+        prompt_limit = (
+            max_prompt_tokens if max_prompt_tokens is not None else sys.maxsize
+        )
+        if token_cost <= 0:
+            return prompt_limit
+
+        return min(
+            max(int(remaining_budget / token_cost) - max_tokens, 0), prompt_limit
+        )
@@ -0,0 +1,70 @@
+import asyncio
+from typing import List
+
+from config import get_config
+from dpn_pyutils.common import get_logger
+from summariser.aggregates import SpendAggregates
+from summariser.ledger import SpendLedger
+from summariser.schemas import SpendEntry
+
+log = get_logger(__name__)
+
+config = get_config()
+
+
+class SpendRecorder:
+    """
+    Write-behind buffer for spend entries. Entries are counted in the running aggregates
+    straight away and written to the ledger in batches by a background task, so recording
+    spend never waits on disk or network I/O on the interaction path.
+    """
+
+    queue: asyncio.Queue[SpendEntry]
+    ledger: SpendLedger
+    aggregates: SpendAggregates
+
+    def __init__(self, ledger: SpendLedger, aggregates: SpendAggregates):
+        """
+        Initializes the recorder
+        """
+
+        self.queue = asyncio.Queue()
+        self.ledger = ledger
+        self.aggregates = aggregates
+
+    def push(self, entry: SpendEntry) -> None:
+        """
+        Records a spend entry without blocking
+        """
+
+        self.aggregates.add(entry)
+        self.queue.put_nowait(entry)
+
+    def flush(self) -> int:
+        """
+        Writes the buffered entries to the ledger in batches. Returns the number written.
+        """
+
+        written = 0
+        while not self.queue.empty():
+            batch: List[SpendEntry] = []
+            while (
+                not self.queue.empty()
+                and len(batch) < config.SUMMARISER_SPEND_FLUSH_BATCH_SIZE
+            ):
+                batch.append(self.queue.get_nowait())
+
+            try:
+                self.ledger.append_many(batch)
+            except Exception:
+                # Put the batch back so it is retried on the next flush
+                for entry in batch:
+                    self.queue.put_nowait(entry)
+                raise
+
+            written += len(batch)
+
+        if written > 0:
+            log.debug("Flushed %d spend entries to the ledger", written)
+
+        return written
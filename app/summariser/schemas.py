@@ -12,6 +12,8 @@ class ChatMessage(BaseModel):
     display_name: str
     message: str
     created_at: datetime
+    reply_to_id: int | None = None
+    reactions: int = 0
 
 
 class OpenAIResponse(BaseModel):
@@ -20,6 +22,17 @@ class OpenAIResponse(BaseModel):
     total_tokens: int
     completion_tokens: int
     prompt_tokens: int
+    cached_prompt_tokens: int = 0
+    duration: float = 0.0
+
+
+class SummaryRoute(BaseModel):
+
+    name: str
+    model: str
+    max_tokens: int
+    token_cost: float
+    estimated_prompt_tokens: int
 
 
 class TokenUserHistory(BaseModel):
@@ -28,6 +41,7 @@ class TokenUserHistory(BaseModel):
     name: str
     display_name: str
     tokens: int
+    cached_tokens: int = 0
     cost: float
     created_at: datetime
 
@@ -37,24 +51,114 @@ class TokenChannelHistory(BaseModel):
     id: int
     name: str
     tokens: int
+    cached_tokens: int = 0
     cost: float
     created_at: datetime
 
 
+class TokenUserMonthly(BaseModel):
+
+    id: int
+    name: str
+    display_name: str
+    year: int
+    month: int
+    tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+    requests: int = 0
+
+
+class TokenChannelMonthly(BaseModel):
+
+    id: int
+    name: str
+    year: int
+    month: int
+    tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+    requests: int = 0
+
+
+class SpendEntry(BaseModel):
+
+    created_at: datetime
+    user_id: int | None = None
+    user_name: str | None = None
+    user_display_name: str | None = None
+    channel_id: int | None = None
+    channel_name: str | None = None
+    tokens: int
+    cached_tokens: int = 0
+    cost: float
+
+    # Imported monthly buckets stand for several requests. The per-channel buckets repeat
+    # the spend of the per-user buckets, so they only count towards channel breakdowns.
+    requests: int = 1
+    breakdown_only: bool = False
+
+
 class TokenHistory(BaseModel):
 
     total_tokens: int = 0
+    total_cached_tokens: int = 0
     total_cost: float = 0.0
 
     user_history: List[TokenUserHistory] = []
     channel_history: List[TokenChannelHistory] = []
 
+    # Closed months rolled up per user and per channel
+    user_monthly: List[TokenUserMonthly] = []
+    channel_monthly: List[TokenChannelMonthly] = []
+
+
+class SpendReportItem(BaseModel):
+
+    id: int
+    name: str
+    cost: float
+    tokens: int
+    requests: int
+
+
+class SpendReportPeriod(BaseModel):
+
+    start_dt: datetime
+    cost: float
+    requests: int
+
+
+class SpendReport(BaseModel):
+
+    start_dt: datetime
+    end_dt: datetime
+    total_cost: float = 0.0
+    total_tokens: int = 0
+    requests: int = 0
+    cost_per_request: float = 0.0
+    period_days: int = 1
+
+    top_users: List[SpendReportItem] = []
+    top_channels: List[SpendReportItem] = []
+    periods: List[SpendReportPeriod] = []
+
+
+class PreparedDailySummary(BaseModel):
+
+    response: str
+    prepared_at: datetime
+    last_message_at: datetime
+    total_tokens: int
+
 
 class ChannelCacheResponse(BaseModel):
 
     key: str
     response: str
     expires_at: datetime
+    warmed: bool = False
+    hits: int = 0
 
 class GenerationSnapshotSchema(BaseModel):
     """
@@ -67,8 +171,11 @@ class GenerationSnapshotSchema(BaseModel):
     name: str
     display_name: str
     user_id: int
-    prompt: str
+    prompt: str = ""
     response: str
     estimated_tokens: int
     actual_tokens: int
     estimated_cost: Decimal
+    cached_tokens: int = 0
+    duration: float = 0.0
+    route: str = ""
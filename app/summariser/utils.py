@@ -23,3 +23,18 @@ def parse_time_period(time_period: str, past: bool = True) -> datetime:
         raise ValueError(
             "Invalid time period, should be in hours (h) or days (d), e.g. '24h' or '7d'"
         )
+
+
+def parse_time_period_hours(time_period: str) -> float:
+    """
+    Parses a time period string and returns the length of the period in hours
+    """
+
+    if time_period.endswith("h"):
+        return float(time_period[:-1])
+    elif time_period.endswith("d"):
+        return float(time_period[:-1]) * 24
+    else:
+        raise ValueError(
+            "Invalid time period, should be in hours (h) or days (d), e.g. '24h' or '7d'"
+        )
@@ -0,0 +1,140 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import pytz
+from config import get_config
+from dpn_pyutils.common import get_logger
+from summariser.schemas import ChannelCacheResponse
+
+log = get_logger(__name__)
+
+config = get_config()
+
+
+class DigestWarmer:
+    """
+    Decides which channels should have their default digest generated speculatively,
+    keeps the daily warming spend within budget and tracks how often warmed digests are used
+    """
+
+    new_messages: Dict[int, int]
+    last_message_at: Dict[int, datetime]
+    spend_date: date
+    spend_today: float
+    warmed_entries: int
+    warmed_entries_hit: int
+    warmed_hits: int
+
+    def __init__(self):
+        """
+        Initializes the warmer
+        """
+
+        self.new_messages = {}
+        self.last_message_at = {}
+        self.spend_date = self.get_local_date()
+        self.spend_today = 0.0
+        self.warmed_entries = 0
+        self.warmed_entries_hit = 0
+        self.warmed_hits = 0
+
+    def get_local_date(self) -> date:
+        """
+        Gets the current date in the configured timezone, which is when the budget resets
+        """
+
+        return datetime.now(tz=pytz.timezone(config.TIMEZONE)).date()
+
+    def record_message(self, channel: int, created_at: datetime) -> None:
+        """
+        Records a newly posted message in a channel
+        """
+
+        self.new_messages[channel] = self.new_messages.get(channel, 0) + 1
+        self.last_message_at[channel] = created_at
+
+    def get_channels_to_warm(self, now: datetime | None = None) -> List[int]:
+        """
+        Gets the channels that have accumulated enough new messages, or have gone quiet
+        after a burst, busiest first
+        """
+
+        if now is None:
+            now = datetime.now(tz=pytz.UTC)
+
+        quiet_threshold_dt = now - timedelta(
+            seconds=config.SUMMARISER_WARM_QUIET_SECONDS
+        )
+        channels = [
+            channel
+            for channel, count in self.new_messages.items()
+            if count >= config.SUMMARISER_WARM_MESSAGE_THRESHOLD
+            or (
+                count >= config.SUMMARISER_WARM_BURST_MESSAGES
+                and self.last_message_at[channel] < quiet_threshold_dt
+            )
+        ]
+
+        return sorted(channels, key=lambda c: self.new_messages[c], reverse=True)
+
+    def mark_warmed(self, channel: int) -> None:
+        """
+        Resets the new message count of a channel once its digest has been warmed
+        """
+
+        self.new_messages.pop(channel, None)
+
+    def get_remaining_budget(self) -> float:
+        """
+        Gets the warming budget remaining for today
+        """
+
+        today = self.get_local_date()
+        if today != self.spend_date:
+            self.spend_date = today
+            self.spend_today = 0.0
+
+        return max(0.0, config.SUMMARISER_WARM_DAILY_BUDGET - self.spend_today)
+
+    def record_spend(self, cost: float) -> None:
+        """
+        Records the cost of a warmed digest against today's budget
+        """
+
+        self.get_remaining_budget()
+        self.spend_today += cost
+        self.warmed_entries += 1
+
+    def record_hit(self, response: ChannelCacheResponse) -> None:
+        """
+        Records a cached digest being served, counting hits against warmed entries
+        """
+
+        response.hits += 1
+        if not response.warmed:
+            return
+
+        self.warmed_hits += 1
+        if response.hits == 1:
+            self.warmed_entries_hit += 1
+
+    def get_hit_rate(self) -> float:
+        """
+        Gets the share of warmed entries that were served at least once
+        """
+
+        if self.warmed_entries == 0:
+            return 0.0
+
+        return self.warmed_entries_hit / self.warmed_entries
+
+    def get_stats_summary(self) -> str:
+        """
+        Gets a one line summary of warming spend and hit rates
+        """
+
+        return (
+            f"{self.warmed_entries_hit}/{self.warmed_entries} warmed digests used "
+            f"({self.get_hit_rate():0.0%}), {self.warmed_hits} cache hits, "
+            f"US ${self.spend_today:0.6f} spent today"
+        )
@@ -0,0 +1,92 @@
+"""
+Benchmarks parsing a large Humanitix ticket page with the full models against the lean
+projection. Run with: PYTHONPATH=app:. python tests/benchmark_humanitix_parse.py
+"""
+
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+from humanitix.models import LeanTickets, Tickets
+
+TICKET_COUNT = 5000
+RUNS = 5
+
+
+def create_payload(ticket_count: int) -> bytes:
+    """
+    Creates a ticket page shaped like a Humanitix response, with the fields the summary
+    does not use
+    """
+
+    tickets = [
+        {
+            "_id": f"ticket-{idx}",
+            "orderId": f"order-{idx}",
+            "eventId": "event-1",
+            "eventDateId": "date-1",
+            "ticketTypeId": "type-1",
+            "ticketTypeName": "General Admission",
+            "firstName": "First",
+            "lastName": f"Last {idx}",
+            "email": f"attendee{idx}@example.com",
+            "price": 10.0,
+            "fee": 1.0,
+            "total": 11.0,
+            "currency": "AUD",
+            "status": "complete",
+            "isDonation": False,
+            "createdAt": "2024-09-01T00:00:00Z",
+            "updatedAt": "2024-09-01T00:00:00Z",
+            "customScanningCode": None,
+            "qrCodeData": {"url": f"https://example.com/ticket/{idx}"},
+            "additionalFields": [
+                {"questionId": f"question-{q}", "value": "no"} for q in range(5)
+            ],
+        }
+        for idx in range(ticket_count)
+    ]
+
+    return json.dumps(
+        {"total": ticket_count, "pageSize": ticket_count, "page": 1, "tickets": tickets}
+    ).encode()
+
+
+def measure(parse: Callable[[bytes], Any], payload: bytes) -> Tuple[float, int]:
+    """
+    Gets the best parse time in seconds over several runs, and the memory held by the
+    parsed result in bytes
+    """
+
+    best = float("inf")
+    for _ in range(RUNS):
+        started_at = time.perf_counter()
+        parse(payload)
+        best = min(best, time.perf_counter() - started_at)
+
+    tracemalloc.start()
+    result = parse(payload)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return best, retained
+
+
+def main() -> None:
+    payload = create_payload(TICKET_COUNT)
+    print(f"{TICKET_COUNT} tickets, {len(payload) / 1024:.0f} KiB payload")
+
+    for name, parse in (
+        ("full", lambda b: Tickets.model_validate(json.loads(b))),
+        ("lean", LeanTickets.model_validate_json),
+    ):
+        duration, retained = measure(parse, payload)
+        print(
+            f"{name}: {duration * 1000:.1f} ms, {retained / 1024 / 1024:.1f} MiB retained"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmarks aggregating the orders, contributions and spares of one event, adding the
+tickets one by one against the bulk pass. Run with:
+PYTHONPATH=app:. python tests/benchmark_humanitix_summary.py
+"""
+
+import time
+from typing import Callable, List
+
+from humanitix.models import LeanTicket, LeanTickets
+from humanitix.store import EventTickets
+from tests.test_humanitix_client import create_event
+
+TICKET_COUNTS = (500, 5000, 20000)
+RUNS = 5
+
+
+def create_tickets(ticket_count: int) -> List[LeanTicket]:
+    """
+    Creates tickets with a few answered questions, a third wanting a laptop
+    """
+
+    return LeanTickets.model_validate(
+        {
+            "total": ticket_count,
+            "pageSize": ticket_count,
+            "page": 1,
+            "tickets": [
+                {
+                    "_id": f"ticket-{idx}",
+                    "price": 10.0,
+                    "additionalFields": [
+                        {"questionId": f"question-{q}", "value": "no"}
+                        for q in range(2, 6)
+                    ]
+                    + [
+                        {
+                            "questionId": "question-1",
+                            "value": "yes" if idx % 3 == 0 else "no",
+                        }
+                    ],
+                }
+                for idx in range(ticket_count)
+            ],
+        }
+    ).tickets
+
+
+def measure(aggregate: Callable[[], None]) -> float:
+    """
+    Gets the best time in seconds over several runs
+    """
+
+    best = float("inf")
+    for _ in range(RUNS):
+        started_at = time.perf_counter()
+        aggregate()
+        best = min(best, time.perf_counter() - started_at)
+
+    return best
+
+
+def main() -> None:
+    event = create_event("event-1", "DadLAN Melbourne Subnet Oct 2024")
+
+    for ticket_count in TICKET_COUNTS:
+        tickets = create_tickets(ticket_count)
+        event_tickets = EventTickets(event)
+
+        def upsert_each(
+            event_tickets: EventTickets = event_tickets,
+            tickets: List[LeanTicket] = tickets,
+        ) -> None:
+            event_tickets.clear()
+            for t in tickets:
+                event_tickets.upsert(t)
+
+        def replace_all(
+            event_tickets: EventTickets = event_tickets,
+            tickets: List[LeanTicket] = tickets,
+        ) -> None:
+            event_tickets.replace(tickets)
+
+        one_by_one = measure(upsert_each)
+        bulk = measure(replace_all)
+        print(
+            f"{ticket_count} tickets: one by one {one_by_one * 1000:.2f} ms, "
+            f"bulk {bulk * 1000:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmarks /tix end to end against the local Humanitix and portal stand-ins: fetching the
+events, syncing and summarising their tickets and applying the MaxHealth data. Cold runs
+start from an empty ticket store, warm runs sync the changes since the previous run.
+Run with: PYTHONPATH=app:. python tests/benchmark_tix.py [--latency 0.02]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List
+
+import httpx
+from config import get_config
+from dadlan.client import portal_client
+from humanitix.client import HumanitixClient
+from humanitix.maxhealth import apply_maxhealth_info
+from humanitix.models import Events
+from humanitix.scheduler import RequestScheduler
+from humanitix.store import TicketStore
+from humanitix.summary import create_summary_from_event_data
+from tests.humanitix_server import HumanitixServer, create_synthetic_data
+from tests.portal_server import VARIABLES_PATH, PortalServer
+
+config = get_config()
+
+SIZES = ((5, 100), (20, 500), (50, 2000))
+
+
+async def run_tix(client: HumanitixClient, store: TicketStore) -> float:
+    """
+    Builds the /tix summary once and returns how long it took in seconds
+    """
+
+    started_at = time.perf_counter()
+
+    events = Events.model_validate(await client.get_all_events()).events
+    summary_data = await create_summary_from_event_data(events, store)
+    await apply_maxhealth_info(summary_data)
+
+    return time.perf_counter() - started_at
+
+
+def format_percentiles(durations: List[float]) -> str:
+    """
+    Formats the p50 and p95 of the durations in milliseconds
+    """
+
+    quantiles = statistics.quantiles(durations, n=20, method="inclusive")
+
+    return f"p50 {quantiles[9] * 1000:7.1f} ms, p95 {quantiles[18] * 1000:7.1f} ms"
+
+
+async def benchmark_size(
+    event_count: int, tickets_per_event: int, args: argparse.Namespace
+) -> None:
+    """
+    Runs the cold and warm benchmarks for one number of events and tickets
+    """
+
+    events, tickets = create_synthetic_data(event_count, tickets_per_event)
+    server = HumanitixServer(
+        events=events,
+        tickets=tickets,
+        latency=args.latency,
+        error_rate=args.error_rate,
+    ).start()
+
+    # Half of the subnets have MaxHealth data
+    max_health = {
+        " ".join(e["name"].split(" ")[1:-2]): 100 for e in events[: event_count // 2]
+    }
+    portal = PortalServer(
+        variables={config.RENDER_TIX_MAXHEALTH_VAR_NAME: json.dumps(max_health)}
+    ).start()
+    portal_client.http_client = httpx.AsyncClient(
+        base_url=f"{portal.url}{VARIABLES_PATH}"
+    )
+
+    client = HumanitixClient()
+    client.base_path = f"{server.url}/v1"
+    client.scheduler = RequestScheduler(rate=args.rate)
+
+    try:
+        cold = []
+        for _ in range(args.runs):
+            cold.append(await run_tix(client, TicketStore(client)))
+
+        store = TicketStore(client)
+        await run_tix(client, store)
+        warm = []
+        for _ in range(args.runs):
+            warm.append(await run_tix(client, store))
+
+        print(
+            f"{event_count:3d} events x {tickets_per_event:5d} tickets: "
+            f"cold {format_percentiles(cold)} | warm {format_percentiles(warm)} | "
+            f"{len(server.requests)} requests"
+        )
+    finally:
+        await client.close()
+        await portal_client.close()
+        server.stop()
+        portal.stop()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument(
+        "--rate", type=float, default=0.0, help="Client request rate limit, 0 is none"
+    )
+    args = parser.parse_args()
+
+    for event_count, tickets_per_event in SIZES:
+        await benchmark_size(event_count, tickets_per_event, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,261 @@
+"""
+Local stand-in for the Humanitix API, for testing and load testing the Humanitix client
+offline. It serves synthetic events and tickets, or a recording of real ones, with
+pagination, added latency and injected errors. Run it with
+`python tests/humanitix_server.py --port 8081` and point HUMANITIX_API at
+http://127.0.0.1:8081.
+
+A recording is a JSON file of {"events": [...], "tickets": {"<event id>": [...]}}, in the
+shape the API returns them.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+SUBNETS = ["Melbourne", "Sydney", "Brisbane", "Perth", "Adelaide", "Hobart", "Darwin"]
+
+
+def create_synthetic_data(
+    event_count: int, tickets_per_event: int, seed: int = 0
+) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+    """
+    Creates events named like DadLAN subnets, each with a loaner laptop question and
+    tickets answering it
+    """
+
+    rng = random.Random(seed)
+    events = []
+    tickets = {}
+
+    for event_idx in range(event_count):
+        event_id = f"event-{event_idx}"
+        subnet = f"{SUBNETS[event_idx % len(SUBNETS)]}{event_idx // len(SUBNETS) or ''}"
+        events.append(
+            {
+                "_id": event_id,
+                "location": "AU",
+                "currency": "AUD",
+                "name": f"DadLAN {subnet} Subnet Oct 2024",
+                "description": "",
+                "slug": f"dadlan-{subnet.lower()}-subnet",
+                "userId": "user",
+                "organiserId": "organiser",
+                "tagIds": [],
+                "classification": {"type": "", "category": "", "subcategory": ""},
+                "public": True,
+                "published": True,
+                "suspendSales": False,
+                "markedAsSoldOut": False,
+                "startDate": "2024-10-01T00:00:00Z",
+                "endDate": "2024-10-03T00:00:00Z",
+                "timezone": "Australia/Melbourne",
+                "totalCapacity": tickets_per_event,
+                "additionalQuestions": [
+                    {
+                        "_id": f"question-{event_idx}",
+                        "question": "Do you need to borrow a laptop?",
+                    }
+                ],
+            }
+        )
+        tickets[event_id] = [
+            {
+                "_id": f"ticket-{event_idx}-{ticket_idx}",
+                "orderId": f"order-{event_idx}-{ticket_idx}",
+                "eventId": event_id,
+                "status": "complete",
+                "price": float(rng.choice([0, 10, 20, 50])),
+                "firstName": "First",
+                "lastName": f"Last {ticket_idx}",
+                "email": f"attendee{ticket_idx}@example.com",
+                "createdAt": "2024-09-01T00:00:00+00:00",
+                "updatedAt": "2024-09-01T00:00:00+00:00",
+                "additionalFields": [
+                    {
+                        "questionId": f"question-{event_idx}",
+                        "value": "yes" if rng.random() < 0.2 else "no",
+                    }
+                ],
+            }
+            for ticket_idx in range(tickets_per_event)
+        ]
+
+    return events, tickets
+
+
+class HumanitixRequestHandler(BaseHTTPRequestHandler):
+
+    server: "HumanitixServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: Dict, headers: Dict[str, str] | None = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_page(self, items_key: str, items: List[Dict], query: Dict[str, List]):
+        page = int(query.get("page", ["1"])[0])
+        page_size = min(
+            int(query.get("pageSize", ["100"])[0]), self.server.max_page_size
+        )
+        start = (page - 1) * page_size
+
+        self.send_json(
+            200,
+            {
+                "total": len(items),
+                "pageSize": page_size,
+                "page": page,
+                items_key: items[start : start + page_size],
+            },
+        )
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.server.record(self.command, url.path)
+
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+        if self.server.should_fail():
+            self.send_json(
+                self.server.error_status,
+                {"error": "Injected error"},
+                {"Retry-After": str(self.server.retry_after)},
+            )
+            return
+
+        segments = url.path.strip("/").split("/")
+        if segments == ["v1", "events"]:
+            self.send_page("events", self.server.events, query)
+        elif len(segments) == 4 and segments[:2] == ["v1", "events"]:
+            if segments[3] != "tickets" or segments[2] not in self.server.tickets:
+                self.send_json(404, {"error": "Not found"})
+                return
+
+            status = query.get("status", ["complete"])[0]
+            tickets = [
+                t
+                for t in self.server.tickets[segments[2]]
+                if t.get("status", "complete") == status
+            ]
+            if "since" in query:
+                since = datetime.fromisoformat(query["since"][0])
+                tickets = [
+                    t
+                    for t in tickets
+                    if datetime.fromisoformat(t["updatedAt"]) >= since
+                ]
+
+            self.send_page("tickets", tickets, query)
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+
+class HumanitixServer(ThreadingHTTPServer):
+    """
+    Serves events and tickets from memory, a page at a time. Every request waits for the
+    latency, and the error rate is the fraction of requests answered with the error status
+    instead (with a Retry-After). Requests are recorded as (method, path) so that tests
+    can count round trips.
+    """
+
+    daemon_threads = True
+
+    events: List[Dict]
+    tickets: Dict[str, List[Dict]]
+    latency: float
+    error_rate: float
+    error_status: int
+    retry_after: float
+    max_page_size: int
+    requests: List[tuple]
+
+    def __init__(
+        self,
+        port: int = 0,
+        events: List[Dict] | None = None,
+        tickets: Dict[str, List[Dict]] | None = None,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        retry_after: float = 0.05,
+        max_page_size: int = 100,
+        seed: int = 0,
+    ):
+        super().__init__(("127.0.0.1", port), HumanitixRequestHandler)
+        self.events = list(events or [])
+        self.tickets = dict(tickets or {})
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.max_page_size = max_page_size
+        self.requests = []
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def record(self, method: str, path: str):
+        with self.lock:
+            self.requests.append((method, path))
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    def start(self) -> "HumanitixServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--recording", help="JSON file of events and tickets")
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    args = parser.parse_args()
+
+    if args.recording:
+        with open(args.recording) as f:
+            recording = json.load(f)
+        events, tickets = recording["events"], recording["tickets"]
+    else:
+        events, tickets = create_synthetic_data(args.events, args.tickets)
+
+    server = HumanitixServer(
+        args.port,
+        events,
+        tickets,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+    print(f"Serving {len(events)} Humanitix events on {server.url}")
+    server.serve_forever()
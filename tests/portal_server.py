@@ -0,0 +1,115 @@
+"""
+Local stand-in for the DadLAN WAN Portal variables API, for testing the portal client
+offline. Run it with `python tests/portal_server.py [port]` and point DADLAN_WAN_API_URL
+at http://127.0.0.1:<port>.
+"""
+
+import hashlib
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+VARIABLES_PATH = "/api/v1/sys/variables/"
+
+
+def get_etag(value: str) -> str:
+    """
+    Gets the ETag of a variable value
+    """
+
+    return '"' + hashlib.sha1(value.encode("utf-8")).hexdigest() + '"'
+
+
+class PortalRequestHandler(BaseHTTPRequestHandler):
+
+    server: "PortalServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: Dict, headers: Dict[str, str] | None = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.server.record(self.command, url.path)
+
+        if url.path == VARIABLES_PATH:
+            names = parse_qs(url.query).get("names", [""])[0].split(",")
+            variables = [
+                {"name": n, "value": v, "etag": get_etag(v)}
+                for n in names
+                if (v := self.server.variables.get(n)) is not None
+            ]
+            self.send_json(200, {"variables": variables})
+            return
+
+        name = url.path.removeprefix(VARIABLES_PATH)
+        if name not in self.server.variables:
+            self.send_json(404, {"error": "Not found"})
+            return
+
+        etag = get_etag(self.server.variables[name])
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_json(200, {"value": self.server.variables[name]}, {"ETag": etag})
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        self.server.record(self.command, url.path)
+
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.variables[url.path.removeprefix(VARIABLES_PATH)] = body["value"]
+        self.send_json(200, {})
+
+
+class PortalServer(ThreadingHTTPServer):
+    """
+    Serves variables from memory, with ETags and the bulk endpoint. Requests are recorded as
+    (method, path) so that tests can count round trips.
+    """
+
+    variables: Dict[str, str]
+    requests: List[tuple]
+
+    def __init__(self, port: int = 0, variables: Dict[str, str] | None = None):
+        super().__init__(("127.0.0.1", port), PortalRequestHandler)
+        self.variables = dict(variables or {})
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def record(self, method: str, path: str):
+        with self.lock:
+            self.requests.append((method, path))
+
+    def start(self) -> "PortalServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    server = PortalServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    print(f"Serving portal variables on {server.url}")
+    server.serve_forever()
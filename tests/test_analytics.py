@@ -0,0 +1,156 @@
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytz
+from summariser.analytics import create_spend_report
+from summariser.history import compact_token_history
+from summariser.ledger import SpendLedger, apply_entries_to_token_history
+from summariser.schemas import SpendEntry, TokenHistory
+
+
+class TestSpendAnalytics(unittest.TestCase):
+    """
+    Tests the columnar spend report over the ledger
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.ledger = SpendLedger(Path(self.temp_dir.name, "ledger.sqlite3"))
+        self.start_dt = datetime(2024, 5, 1, tzinfo=pytz.UTC)
+
+        self.entries = [
+            SpendEntry(
+                created_at=self.start_dt + timedelta(hours=idx * 7),
+                user_id=100 + idx % 3,
+                user_name=f"person{idx % 3}",
+                user_display_name=f"Person {idx % 3}",
+                channel_id=200 + idx % 2,
+                channel_name=f"channel-{idx % 2}",
+                tokens=1000,
+                cost=0.001 * (1 + idx % 3),
+            )
+            for idx in range(40)
+        ]
+        self.ledger.append_many(self.entries)
+
+    def tearDown(self):
+        self.ledger.close()
+        self.temp_dir.cleanup()
+
+    def test_report_matches_entries(self):
+        """
+        Tests that the report totals, rankings and daily costs match the raw entries
+        """
+
+        end_dt = self.start_dt + timedelta(days=7)
+        report = create_spend_report(self.ledger, self.start_dt, end_dt, limit=2)
+        in_range = [e for e in self.entries if e.created_at < end_dt]
+
+        self.assertEqual(report.requests, len(in_range))
+        self.assertAlmostEqual(report.total_cost, sum(e.cost for e in in_range))
+        self.assertEqual(report.period_days, 1)
+        self.assertEqual(len(report.periods), 7)
+        self.assertAlmostEqual(sum(p.cost for p in report.periods), report.total_cost)
+        self.assertEqual(sum(p.requests for p in report.periods), report.requests)
+
+        self.assertEqual(len(report.top_users), 2)
+        self.assertEqual(report.top_users[0].id, 102)
+        self.assertEqual(report.top_users[0].name, "Person 2")
+        self.assertAlmostEqual(
+            report.top_users[0].cost,
+            sum(e.cost for e in in_range if e.user_id == 102),
+        )
+        self.assertEqual({c.id for c in report.top_channels}, {200, 201})
+
+    def test_long_range_is_bucketed(self):
+        """
+        Tests that long ranges are summed into multi-day periods
+        """
+
+        report = create_spend_report(
+            self.ledger, self.start_dt, self.start_dt + timedelta(days=365)
+        )
+
+        self.assertEqual(report.period_days, 12)
+        self.assertLessEqual(len(report.periods), 31)
+        self.assertEqual(report.requests, len(self.entries))
+
+    def test_empty_range(self):
+        """
+        Tests that a range without spend gives an empty report
+        """
+
+        report = create_spend_report(
+            self.ledger,
+            datetime(2020, 1, 1, tzinfo=pytz.UTC),
+            datetime(2020, 2, 1, tzinfo=pytz.UTC),
+        )
+
+        self.assertEqual(report.requests, 0)
+        self.assertEqual(report.top_users, [])
+
+    def test_empty_ledger(self):
+        """
+        Tests that a ledger without any entries gives empty columns and an empty report
+        """
+
+        empty_ledger = SpendLedger(Path(self.temp_dir.name, "empty.sqlite3"))
+        end_dt = self.start_dt + timedelta(days=7)
+
+        try:
+            columns = empty_ledger.get_columns(self.start_dt, end_dt)
+            report = create_spend_report(empty_ledger, self.start_dt, end_dt)
+        finally:
+            empty_ledger.close()
+
+        self.assertEqual(columns, ((),) * 7)
+        self.assertEqual(report.requests, 0)
+        self.assertEqual(report.total_cost, 0)
+        self.assertEqual(report.top_channels, [])
+
+    def test_imported_buckets(self):
+        """
+        Tests that the report counts imported monthly buckets once, with their requests
+        """
+
+        bucket_ledger = SpendLedger(Path(self.temp_dir.name, "buckets.sqlite3"))
+        entries = [
+            SpendEntry(
+                created_at=self.start_dt + timedelta(hours=idx),
+                user_id=100,
+                user_name="person0",
+                user_display_name="Person 0",
+                channel_id=200,
+                channel_name="channel-0",
+                tokens=100,
+                cost=1.0,
+            )
+            for idx in range(3)
+        ]
+        bucket_ledger.import_token_history(
+            compact_token_history(
+                apply_entries_to_token_history(TokenHistory(), entries),
+                self.start_dt + timedelta(days=31),
+            )
+        )
+
+        try:
+            report = create_spend_report(
+                bucket_ledger, self.start_dt, self.start_dt + timedelta(days=7)
+            )
+        finally:
+            bucket_ledger.close()
+
+        self.assertAlmostEqual(report.total_cost, 3.0)
+        self.assertEqual(report.requests, 3)
+        self.assertEqual(report.total_tokens, 300)
+        self.assertAlmostEqual(report.cost_per_request, 1.0)
+        self.assertEqual(sum(p.requests for p in report.periods), 3)
+        self.assertEqual(
+            [(u.id, u.cost, u.requests) for u in report.top_users], [(100, 3.0, 3)]
+        )
+        self.assertEqual(
+            [(c.id, c.cost, c.requests) for c in report.top_channels], [(200, 3.0, 3)]
+        )
@@ -0,0 +1,168 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import dadlan.client
+import httpx
+from dadlan.client import PortalClient
+from tests.portal_server import VARIABLES_PATH, PortalServer
+
+
+class TestPortalClient(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests the pooled portal variables client
+    """
+
+    async def asyncSetUp(self):
+        self.requests = []
+        self.failures = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            if self.failures > 0:
+                self.failures -= 1
+                return httpx.Response(503)
+            if request.url.path.endswith("/missing"):
+                return httpx.Response(404, text="Not found")
+            if request.method == "PUT":
+                return httpx.Response(200, json={})
+
+            return httpx.Response(200, json={"value": "42"})
+
+        self.portal = PortalClient()
+        self.portal.http_client = httpx.AsyncClient(
+            base_url="http://portal.test/api/v1/sys/variables/",
+            transport=httpx.MockTransport(handler),
+        )
+
+    async def asyncTearDown(self):
+        await self.portal.close()
+
+    async def test_get_and_set_variable(self):
+        """
+        Tests getting and setting variables over the shared client
+        """
+
+        self.assertEqual(await self.portal.get_variable("a.b", "0"), "42")
+        self.assertEqual(await self.portal.get_variable("missing", "0"), "0")
+        await self.portal.set_variable("a.b", "43")
+
+        self.assertEqual(
+            self.requests[0].url, "http://portal.test/api/v1/sys/variables/a.b"
+        )
+        self.assertEqual(self.requests[2].method, "PUT")
+
+    async def test_retries_server_errors(self):
+        """
+        Tests that server errors are retried
+        """
+
+        self.failures = 1
+        self.assertEqual(await self.portal.get_variable("a.b", "0"), "42")
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_cache_and_invalidation(self):
+        """
+        Tests that variables are served from cache until set
+        """
+
+        self.assertEqual(await self.portal.get_variable("a.b", "0"), "42")
+        self.assertEqual(await self.portal.get_variable("a.b", "0"), "42")
+        self.assertEqual(len(self.requests), 1)
+
+        await self.portal.set_variable("a.b", "43")
+        await self.portal.get_variable("a.b", "0")
+        self.assertEqual(len(self.requests), 3)
+
+        await self.portal.get_variable("a.b", "0", max_age=0)
+        self.assertEqual(len(self.requests), 4)
+
+    async def test_missing_variable_cached(self):
+        """
+        Tests that the default of a variable the portal does not have is cached
+        """
+
+        self.assertEqual(await self.portal.get_variable("missing", "0"), "0")
+        self.assertEqual(await self.portal.get_variable("missing", "0"), "0")
+        self.assertEqual(len(self.requests), 1)
+
+        # Once expired, the cached default is served while it is refreshed in the
+        # background, and is then kept for another TTL
+        self.portal.cache["missing"].fetched_at -= self.portal.cache["missing"].ttl
+        self.assertEqual(await self.portal.get_variable("missing", "1"), "0")
+        await asyncio.gather(*self.portal.background_tasks)
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(await self.portal.get_variable("missing", "0"), "0")
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_last_known_good(self):
+        """
+        Tests that the cached value is served while the portal is failing
+        """
+
+        await self.portal.get_variable("a.b", "0")
+        self.failures = 10
+
+        with patch.object(dadlan.client.config, "DADLAN_WAN_API_RETRY_BACKOFF", 0):
+            self.assertEqual(
+                await self.portal.get_variable("a.b", "0", max_age=0), "42"
+            )
+
+
+class TestPortalClientStandIn(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests bulk and conditional requests against the local stand-in portal
+    """
+
+    async def asyncSetUp(self):
+        self.server = PortalServer(
+            variables={"a": "1", "b": "2", "history": "x" * 10000}
+        ).start()
+
+        self.portal = PortalClient()
+        self.portal.http_client = httpx.AsyncClient(
+            base_url=f"{self.server.url}{VARIABLES_PATH}"
+        )
+
+    async def asyncTearDown(self):
+        await self.portal.close()
+        self.server.stop()
+
+    async def test_bulk_fetch(self):
+        """
+        Tests that several variables are fetched in one request
+        """
+
+        with patch.object(dadlan.client.config, "DADLAN_WAN_API_BULK_ENABLE", True):
+            values = await self.portal.get_variables({"a": "0", "b": "0", "c": "3"})
+
+        self.assertEqual(values, {"a": "1", "b": "2", "c": "3"})
+        self.assertEqual(len(self.server.requests), 1)
+
+    async def test_bulk_fallback(self):
+        """
+        Tests that variables are fetched one by one when bulk requests are disabled
+        """
+
+        with patch.object(dadlan.client.config, "DADLAN_WAN_API_BULK_ENABLE", False):
+            values = await self.portal.get_variables({"a": "0", "b": "0"})
+
+        self.assertEqual(values, {"a": "1", "b": "2"})
+        self.assertEqual(len(self.server.requests), 2)
+
+    async def test_conditional_fetch(self):
+        """
+        Tests that unchanged variables are not downloaded again
+        """
+
+        self.assertEqual(
+            await self.portal.get_variable("history", "", max_age=0), "x" * 10000
+        )
+        self.assertEqual(
+            await self.portal.get_variable("history", "", max_age=0), "x" * 10000
+        )
+        self.assertIsNotNone(self.portal.cache["history"].etag)
+
+        self.server.variables["history"] = "y"
+        self.assertEqual(await self.portal.get_variable("history", "", max_age=0), "y")
+        self.assertEqual(len(self.server.requests), 3)
@@ -0,0 +1,128 @@
+import os
+import random
+import time
+import unittest
+from datetime import datetime, timedelta
+from typing import List
+
+import pytz
+from summariser.extractive import score_messages, select_messages
+from summariser.schemas import ChatMessage
+
+WORDS = (
+    "lan party switch router cable laptop spare bagels coffee game server ping "
+    "latency monitor keyboard mouse headset stream build deploy pizza chairs tables"
+).split()
+
+
+def generate_messages(num_messages: int, seed: int = 42) -> List[ChatMessage]:
+    """
+    Generates made up chat messages with random replies and reactions
+    """
+
+    # trunk-ignore(bandit/B311)
+    rng = random.Random(seed)
+    start_dt = datetime.now(tz=pytz.UTC) - timedelta(days=7)
+    messages = []
+    for idx in range(num_messages):
+        reply_to_id = None
+        if idx > 0 and rng.random() < 0.2:
+            reply_to_id = rng.randrange(idx)
+
+        messages.append(
+            ChatMessage(
+                id=idx,
+                name=f"person{idx % 50}",
+                display_name=f"Person {idx % 50}",
+                message=" ".join(rng.choices(WORDS, k=rng.randint(3, 25))),
+                created_at=start_dt + timedelta(seconds=idx * 5),
+                reply_to_id=reply_to_id,
+                reactions=rng.choice([0, 0, 0, 1, 2, 5]),
+            )
+        )
+
+    return messages
+
+
+class TestExtractive(unittest.TestCase):
+    """
+    Tests the local extractive pre-summarisation stage
+    """
+
+    def test_select_within_budget(self):
+        """
+        Tests that the selected messages fit the budget and stay in chronological order
+        """
+
+        messages = generate_messages(2000)
+        selected = select_messages(messages, token_budget=2000)
+
+        self.assertGreater(len(selected), 0)
+        self.assertLess(len(selected), len(messages))
+        self.assertEqual(
+            [m.created_at for m in selected],
+            sorted(m.created_at for m in selected),
+        )
+
+    def test_select_everything_under_budget(self):
+        """
+        Tests that no messages are dropped when they all fit the budget
+        """
+
+        messages = generate_messages(20)
+        selected = select_messages(messages, token_budget=100_000)
+
+        self.assertEqual([m.id for m in selected], [m.id for m in messages])
+
+    def test_select_formatted_size(self):
+        """
+        Tests that messages are measured as formatted, so a longer format fits fewer
+        """
+
+        messages = generate_messages(2000)
+        selected = select_messages(messages, token_budget=2000)
+        selected_formatted = select_messages(
+            messages,
+            token_budget=2000,
+            format_message=lambda m: f"{m.created_at:%Y-%m-%d %H:%M:%S} {m.message}",
+        )
+
+        self.assertGreater(len(selected_formatted), 0)
+        self.assertLess(len(selected_formatted), len(selected))
+
+    def test_engagement_raises_score(self):
+        """
+        Tests that reactions raise the score of otherwise identical messages
+        """
+
+        texts = ["the router needs a reboot", "the router needs a reboot", "pizza"]
+        scores = score_messages(texts, reactions=[10, 0, 0])
+
+        self.assertGreater(scores[0], scores[1])
+
+    def test_messages_without_terms(self):
+        """
+        Tests that messages made only of stop words or emoji do not break scoring
+        """
+
+        scores = score_messages(["lol", ":)", "the"])
+
+        self.assertEqual(len(scores), 3)
+        self.assertAlmostEqual(float(scores.sum()), 1.0, places=6)
+
+    @unittest.skipUnless(os.environ.get("RUN_BENCHMARKS"), "Set RUN_BENCHMARKS=1")
+    def test_benchmark_throughput(self):
+        """
+        Benchmarks scoring and selection throughput on 100k messages
+        """
+
+        messages = generate_messages(100_000)
+
+        start = time.perf_counter()
+        selected = select_messages(messages, token_budget=8000)
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"Selected {len(selected)} of {len(messages)} messages in {elapsed:0.3f}s "
+            f"({len(messages) / elapsed:0.0f} messages/s)"
+        )
@@ -0,0 +1,108 @@
+import unittest
+from datetime import datetime, timedelta
+
+import pytz
+from summariser.client import SummariserClient
+from summariser.history import (
+    compact_token_history,
+    dump_token_history,
+    load_token_history_value,
+)
+from summariser.ledger import apply_entries_to_token_history
+from summariser.schemas import SpendEntry, TokenHistory
+
+
+class TestTokenHistoryCompaction(unittest.TestCase):
+    """
+    Tests rolling up closed months of the token history
+    """
+
+    def setUp(self):
+        start_dt = datetime(2024, 3, 1, tzinfo=pytz.UTC)
+        entries = [
+            SpendEntry(
+                created_at=start_dt + timedelta(hours=idx * 7),
+                user_id=100 + idx % 4,
+                user_name=f"person{idx % 4}",
+                user_display_name=f"Person {idx % 4}",
+                channel_id=200 + idx % 3,
+                channel_name=f"channel-{idx % 3}",
+                tokens=500 + idx,
+                cost=0.000125 * (1 + idx % 5),
+            )
+            for idx in range(400)
+        ]
+        self.token_history = apply_entries_to_token_history(TokenHistory(), entries)
+        self.now = datetime(2024, 5, 10, tzinfo=pytz.UTC)
+
+        # The cost queries do not use any client state
+        self.summariser = SummariserClient.__new__(SummariserClient)
+
+    def test_queries_unchanged(self):
+        """
+        Tests that every monthly cost query returns the same totals after compaction
+        """
+
+        compacted = compact_token_history(self.token_history, self.now)
+
+        self.assertLess(
+            len(compacted.user_history), len(self.token_history.user_history)
+        )
+        self.assertGreater(len(compacted.user_monthly), 0)
+
+        for month in [3, 4, 5, 6]:
+            month_dt = datetime(2024, month, 15, tzinfo=pytz.UTC)
+            for history_query in [
+                self.summariser.get_total_cost_month_all_users,
+                self.summariser.get_total_cost_month_all_channels,
+            ]:
+                self.assertAlmostEqual(
+                    history_query(compacted, month_dt),
+                    history_query(self.token_history, month_dt),
+                    places=9,
+                )
+
+            for user_id in range(100, 104):
+                self.assertAlmostEqual(
+                    self.summariser.get_total_cost_month_user(
+                        compacted, user_id, month_dt
+                    ),
+                    self.summariser.get_total_cost_month_user(
+                        self.token_history, user_id, month_dt
+                    ),
+                    places=9,
+                )
+
+            for channel_id in range(200, 203):
+                self.assertAlmostEqual(
+                    self.summariser.get_total_cost_month_channel(
+                        compacted, channel_id, month_dt
+                    ),
+                    self.summariser.get_total_cost_month_channel(
+                        self.token_history, channel_id, month_dt
+                    ),
+                    places=9,
+                )
+
+    def test_compaction_is_idempotent(self):
+        """
+        Tests that compacting twice does not change the rolled up buckets
+        """
+
+        compacted = compact_token_history(self.token_history, self.now)
+
+        self.assertEqual(compact_token_history(compacted, self.now), compacted)
+
+    def test_compressed_round_trip(self):
+        """
+        Tests that a compressed history is smaller and loads back unchanged
+        """
+
+        compacted = compact_token_history(self.token_history, self.now)
+        compressed = dump_token_history(compacted, compress=True)
+
+        self.assertLess(len(compressed), len(dump_token_history(compacted)))
+        self.assertEqual(load_token_history_value(compressed), compacted)
+        self.assertEqual(
+            load_token_history_value(dump_token_history(compacted)), compacted
+        )
@@ -0,0 +1,635 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+from urllib.parse import parse_qs
+
+import httpx
+import humanitix.cache
+from humanitix.cache import TixSummaryCache
+from humanitix.client import HumanitixClient
+from humanitix.index import EventIndex
+from humanitix.models import Event, Events, LeanTicket, Tickets
+from humanitix.scheduler import (
+    PRIORITY_BACKGROUND,
+    RequestScheduler,
+    get_endpoint_name,
+    request_priority,
+)
+from humanitix.store import EventTickets, TicketStore
+from humanitix.summary import create_summary_events, create_summary_from_event_data
+from tests.humanitix_server import HumanitixServer, create_synthetic_data
+
+
+def create_ticket(idx: int, event_id: str = "event-1", laptop: str = "no") -> dict:
+    return {
+        "_id": f"ticket-{idx}",
+        "orderId": f"order-{idx}",
+        "eventId": event_id,
+        "price": 10.0,
+        "additionalFields": [{"questionId": "question-1", "value": laptop}],
+    }
+
+
+def create_event_json(event_id: str, name: str) -> dict:
+    return {
+        "_id": event_id,
+        "location": "AU",
+        "currency": "AUD",
+        "name": name,
+        "description": "",
+        "slug": event_id,
+        "userId": "user",
+        "organiserId": "organiser",
+        "tagIds": [],
+        "classification": {"type": "", "category": "", "subcategory": ""},
+        "public": True,
+        "published": True,
+        "suspendSales": False,
+        "markedAsSoldOut": False,
+        "startDate": "2024-10-01T00:00:00Z",
+        "endDate": "2024-10-03T00:00:00Z",
+        "timezone": "Australia/Melbourne",
+        "totalCapacity": 100,
+        "additionalQuestions": [
+            {"_id": "question-1", "question": "Do you need to borrow a laptop?"}
+        ],
+    }
+
+
+def create_event(event_id: str, name: str) -> Event:
+    return Event.model_validate(create_event_json(event_id, name))
+
+
+class TestHumanitixPagination(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests fetching every page of a Humanitix list endpoint
+    """
+
+    async def asyncSetUp(self):
+        self.pages_requested = []
+        self.ticket_count = 250
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            query = parse_qs(request.url.query.decode())
+            page = int(query["page"][0])
+            page_size = int(query["pageSize"][0])
+            self.pages_requested.append(page)
+
+            start = (page - 1) * page_size
+            tickets = [
+                create_ticket(i)
+                for i in range(start, min(start + page_size, self.ticket_count))
+            ]
+            return httpx.Response(
+                200,
+                json={
+                    "total": self.ticket_count,
+                    "pageSize": page_size,
+                    "page": page,
+                    "tickets": tickets,
+                },
+            )
+
+        self.client = HumanitixClient()
+        self.client.http_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler)
+        )
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_all_pages_fetched(self):
+        """
+        Tests that tickets past the first page are included, in order
+        """
+
+        tickets = Tickets.model_validate(
+            await self.client.get_all_event_tickets("event-1")
+        ).tickets
+
+        self.assertEqual(len(tickets), self.ticket_count)
+        self.assertEqual(tickets[-1].id, f"ticket-{self.ticket_count - 1}")
+        self.assertEqual(sorted(self.pages_requested), [1, 2, 3])
+
+    async def test_single_page(self):
+        """
+        Tests that a list that fits on one page is fetched in one request
+        """
+
+        self.ticket_count = 20
+        tickets = await self.client.get_all_event_tickets("event-1")
+
+        self.assertEqual(len(tickets["tickets"]), 20)
+        self.assertEqual(self.pages_requested, [1])
+
+    async def test_lean_pages(self):
+        """
+        Tests that lean tickets keep only the summary fields
+        """
+
+        tickets = (await self.client.get_all_event_tickets("event-1", lean=True))[
+            "tickets"
+        ]
+
+        self.assertEqual(len(tickets), self.ticket_count)
+        self.assertIsInstance(tickets[0], LeanTicket)
+        self.assertEqual(tickets[-1].id, f"ticket-{self.ticket_count - 1}")
+        self.assertEqual(tickets[0].additionalFields[0].value, "no")
+        self.assertFalse(hasattr(tickets[0], "orderId"))
+
+
+class TestRequestScheduler(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests the client side rate limits of Humanitix requests
+    """
+
+    async def test_interactive_first(self):
+        """
+        Tests that waiting interactive requests start before waiting background requests
+        """
+
+        scheduler = RequestScheduler(rate=0, burst=1, max_in_flight=1)
+        started = []
+
+        async def request(name: str, priority: int | None = None):
+            if priority is not None:
+                request_priority.set(priority)
+            await scheduler.acquire()
+            started.append(name)
+            scheduler.release()
+
+        await scheduler.acquire()
+        tasks = [
+            asyncio.create_task(request("background", PRIORITY_BACKGROUND)),
+            asyncio.create_task(request("interactive")),
+        ]
+        await asyncio.sleep(0)
+        self.assertEqual(started, [])
+
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(started, ["interactive", "background"])
+
+    async def test_token_bucket(self):
+        """
+        Tests that requests past the burst wait for the bucket to refill
+        """
+
+        scheduler = RequestScheduler(rate=20, burst=2, max_in_flight=10)
+        started_at = time.monotonic()
+        for _ in range(4):
+            await scheduler.acquire()
+            scheduler.release()
+
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.09)
+
+    async def test_retry_after(self):
+        """
+        Tests that a rate limited request is retried after the Retry-After and counted
+        """
+
+        responses = [
+            httpx.Response(429, headers={"Retry-After": "0.1"}),
+            httpx.Response(200, json={}),
+        ]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return responses.pop(0)
+
+        client = HumanitixClient()
+        client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client.scheduler = RequestScheduler(rate=0, burst=1, max_in_flight=2)
+
+        started_at = time.monotonic()
+        await client.make_api_call("GET", "events/event-1/tickets?page=1")
+        await client.close()
+
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.1)
+        stats = client.scheduler.stats["events/{id}/tickets"]
+        self.assertEqual(stats.requests, 2)
+        self.assertEqual(stats.throttled, 1)
+        self.assertEqual(client.scheduler.in_flight, 0)
+
+    async def test_retry_after_holds_queued_requests(self):
+        """
+        Tests that requests queued behind a rate limited request wait out its Retry-After
+        """
+
+        started_at = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            started_at.append(time.monotonic())
+            # Gives the other requests time to queue up behind this one
+            await asyncio.sleep(0.01)
+            if len(started_at) == 1:
+                return httpx.Response(429, headers={"Retry-After": "0.2"})
+
+            return httpx.Response(200, json={})
+
+        client = HumanitixClient()
+        client.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client.scheduler = RequestScheduler(rate=0, burst=1, max_in_flight=1)
+
+        await asyncio.gather(
+            *(client.make_api_call("GET", f"events/event-{idx}") for idx in range(4))
+        )
+        await client.close()
+
+        self.assertEqual(len(started_at), 5)
+        for later_started_at in started_at[1:]:
+            self.assertGreaterEqual(later_started_at - started_at[0], 0.2)
+
+    def test_endpoint_name(self):
+        """
+        Tests that ids and query strings are left out of endpoint names
+        """
+
+        self.assertEqual(get_endpoint_name("events?page=2"), "events")
+        self.assertEqual(
+            get_endpoint_name("events/abc/tickets/def"), "events/{id}/tickets/{id}"
+        )
+
+
+class TestEventIndex(unittest.TestCase):
+    """
+    Tests searching events by name fragment through the trigram index
+    """
+
+    def setUp(self):
+        self.events = [
+            create_event("event-a", "DadLAN Melbourne Subnet Oct 2024"),
+            create_event("event-b", "DadLAN Sydney Subnet Oct 2024"),
+            create_event("event-c", "Sydney Retro Night"),
+        ]
+        self.events[2].published = False
+        self.index = EventIndex(self.events)
+
+    def test_filter(self):
+        """
+        Tests that the index matches a substring scan
+        """
+
+        self.assertEqual(
+            [e.id for e in self.index.filter("SYDNEY")], ["event-b", "event-c"]
+        )
+        self.assertEqual([e.id for e in self.index.filter("bourne")], ["event-a"])
+        self.assertEqual([e.id for e in self.index.filter("-b")], ["event-b"])
+        self.assertEqual(len(self.index.filter(None)), 2)
+        self.assertEqual(len(self.index.filter(None, False)), 3)
+        self.assertIsNone(self.index.filter("perth"))
+
+    def test_complete(self):
+        """
+        Tests that only live events are suggested, prefix matches first
+        """
+
+        self.assertEqual(
+            self.index.complete("mel"), ["DadLAN Melbourne Subnet Oct 2024"]
+        )
+        self.assertEqual(
+            self.index.complete("dadlan sy"), ["DadLAN Sydney Subnet Oct 2024"]
+        )
+        self.assertEqual(self.index.complete("oct", limit=1), [self.events[0].name])
+        self.assertEqual(self.index.complete("retro"), [])
+        self.assertEqual(len(self.index.complete("")), 2)
+
+
+class TestHumanitixSummary(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests building the /tix summary from concurrently fetched events
+    """
+
+    async def asyncSetUp(self):
+        self.ticket_counts = {"event-a": 3, "event-b": 0, "event-c": 7, "event-d": 0}
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            event_id = request.url.path.split("/")[-2]
+            # Later events answer first, so the results arrive out of order
+            await asyncio.sleep(0.01 * (4 - ord(event_id[-1]) + ord("a")))
+
+            count = self.ticket_counts[event_id]
+            return httpx.Response(
+                200,
+                json={
+                    "total": count,
+                    "pageSize": 100,
+                    "page": 1,
+                    "tickets": [
+                        create_ticket(i, event_id, "yes" if i % 2 == 0 else "no")
+                        for i in range(count)
+                    ],
+                },
+            )
+
+        self.client = HumanitixClient()
+        self.client.http_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler)
+        )
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_summary_sorted(self):
+        """
+        Tests that events are sorted by orders, then by name for events without orders
+        """
+
+        events = [
+            create_event(e, f"DadLAN {name} Subnet Oct 2024")
+            for e, name in zip(
+                self.ticket_counts, ["Delta", "Charlie", "Bravo", "Alpha"]
+            )
+        ]
+
+        summary = await create_summary_from_event_data(events, TicketStore(self.client))
+
+        self.assertEqual(
+            [e["id"] for e in summary["events"]],
+            ["event-c", "event-a", "event-d", "event-b"],
+        )
+        self.assertEqual(summary["total_orders"], 10)
+        self.assertEqual(summary["total_spares_needed"], 4 + 2)
+
+
+class TestEventTickets(unittest.TestCase):
+    """
+    Tests the ticket totals of an event
+    """
+
+    def test_replace_matches_upsert(self):
+        """
+        Tests that the bulk totals match adding the tickets one by one
+        """
+
+        tickets = Tickets.model_validate(
+            {
+                "total": 6,
+                "pageSize": 100,
+                "page": 1,
+                "tickets": [
+                    create_ticket(i, laptop=["yes", "no", "YES"][i % 3])
+                    for i in range(6)
+                ],
+            }
+        ).tickets
+        event = create_event("event-1", "DadLAN Melbourne Subnet Oct 2024")
+
+        bulk = EventTickets(event)
+        bulk.replace(tickets)
+        single = EventTickets(event)
+        for t in tickets:
+            single.upsert(t)
+
+        self.assertEqual(bulk.orders, 6)
+        self.assertEqual(bulk.spares_needed, 4)
+        self.assertAlmostEqual(bulk.contributions, 60.0)
+        self.assertEqual(
+            (bulk.orders, bulk.spares_needed, bulk.contributions),
+            (single.orders, single.spares_needed, single.contributions),
+        )
+
+        bulk.remove("ticket-0")
+        self.assertEqual(bulk.spares_needed, 3)
+
+    def test_missing_question(self):
+        """
+        Tests that an event without the loaner laptop question needs no spares
+        """
+
+        event = create_event("event-1", "DadLAN Melbourne Subnet Oct 2024")
+        event.additionalQuestions = []
+        event_tickets = EventTickets(event)
+        event_tickets.upsert(
+            Tickets.model_validate(
+                {
+                    "total": 1,
+                    "pageSize": 100,
+                    "page": 1,
+                    "tickets": [create_ticket(1, laptop="yes")],
+                }
+            ).tickets[0]
+        )
+
+        self.assertIsNone(event_tickets.remote_question_id)
+        self.assertEqual(event_tickets.orders, 1)
+        self.assertEqual(event_tickets.spares_needed, 0)
+
+
+class TestTicketStore(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests syncing tickets incrementally with the since parameter
+    """
+
+    async def asyncSetUp(self):
+        self.complete = {
+            i: create_ticket(i, laptop="yes" if i < 2 else "no") for i in range(5)
+        }
+        self.changed_complete = []
+        self.changed_cancelled = []
+        self.since_values = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            query = parse_qs(request.url.query.decode())
+            status = query["status"][0]
+            if "since" in query:
+                self.since_values.append(query["since"][0])
+                tickets = (
+                    self.changed_complete
+                    if status == "complete"
+                    else self.changed_cancelled
+                )
+            else:
+                tickets = list(self.complete.values())
+
+            return httpx.Response(
+                200,
+                json={
+                    "total": len(tickets),
+                    "pageSize": 100,
+                    "page": 1,
+                    "tickets": tickets,
+                },
+            )
+
+        self.client = HumanitixClient()
+        self.client.http_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler)
+        )
+        self.store = TicketStore(self.client)
+        self.event = create_event("event-1", "DadLAN Alpha Subnet Oct 2024")
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_incremental_sync(self):
+        """
+        Tests that changed and cancelled tickets update the totals
+        """
+
+        event_tickets = await self.store.sync_event(self.event)
+        self.assertEqual(event_tickets.orders, 5)
+        self.assertEqual(event_tickets.spares_needed, 2)
+        self.assertEqual(self.since_values, [])
+
+        # One new ticket, one ticket changes its answer and one is cancelled
+        self.changed_complete = [
+            create_ticket(5, laptop="yes"),
+            create_ticket(3, laptop="yes"),
+        ]
+        self.changed_cancelled = [create_ticket(0, laptop="yes")]
+
+        event_tickets = await self.store.sync_event(self.event)
+
+        self.assertEqual(event_tickets.orders, 5)
+        self.assertEqual(event_tickets.spares_needed, 3)
+        self.assertAlmostEqual(event_tickets.contributions, 50.0)
+        self.assertEqual(len(self.since_values), 2)
+
+        # Applying the same changes again has no effect
+        event_tickets = await self.store.sync_event(self.event)
+        self.assertEqual(event_tickets.orders, 5)
+        self.assertEqual(event_tickets.spares_needed, 3)
+
+
+class TestTixSummaryCache(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests serving /tix summaries from the shared cache
+    """
+
+    async def asyncSetUp(self):
+        self.paths = []
+        self.events = [
+            create_event_json("event-a", "DadLAN Melbourne Subnet Oct 2024"),
+            create_event_json("event-b", "DadLAN Sydney Subnet Oct 2024"),
+        ]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.paths.append(request.url.path)
+            if request.url.path.endswith("/events"):
+                body = {"total": 2, "pageSize": 100, "page": 1, "events": self.events}
+            else:
+                body = {
+                    "total": 2,
+                    "pageSize": 100,
+                    "page": 1,
+                    "tickets": [create_ticket(1), create_ticket(2)],
+                }
+
+            return httpx.Response(200, json=body)
+
+        self.client = HumanitixClient()
+        self.client.http_client = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler)
+        )
+        self.cache = TixSummaryCache(self.client, TicketStore(self.client))
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_served_from_cache(self):
+        """
+        Tests that repeated and per-subnet summaries do not call the API again
+        """
+
+        summary = await self.cache.get_summary()
+        self.assertEqual(summary["total_orders"], 4)
+        request_count = len(self.paths)
+
+        summary = await self.cache.get_summary("sydney")
+        self.assertEqual([e["id"] for e in summary["events"]], ["event-b"])
+        self.assertEqual(summary["total_orders"], 2)
+
+        summary["events"][0]["maxhealth"] = 1
+        self.assertNotIn("maxhealth", self.cache.summary_events["event-b"])
+
+        self.assertIsNone(await self.cache.get_summary("perth"))
+        self.assertEqual(len(self.paths), request_count)
+
+    async def test_only_live_events_synced(self):
+        """
+        Tests that the refresh only syncs live events, and that an event that is not live
+        is synced when a summary names it
+        """
+
+        self.events[1]["published"] = False
+
+        summary = await self.cache.get_summary()
+        self.assertEqual([e["id"] for e in summary["events"]], ["event-a"])
+        self.assertFalse(any("event-b" in p for p in self.paths))
+
+        summary = await self.cache.get_summary("sydney")
+        self.assertEqual([e["id"] for e in summary["events"]], ["event-b"])
+        self.assertEqual(summary["total_orders"], 2)
+        self.assertTrue(any("event-b" in p for p in self.paths))
+
+    async def test_refresh_during_summary(self):
+        """
+        Tests that a refresh replacing the cached summaries while events that are not live
+        are summarised does not lose the events that were cached
+        """
+
+        self.events[1]["published"] = False
+        await self.cache.get_summary()
+
+        async def create_summary_events_during_refresh(events, store):
+            summary_events = await create_summary_events(events, store)
+            self.cache.summary_events = {}
+
+            return summary_events
+
+        with patch.object(
+            humanitix.cache,
+            "create_summary_events",
+            side_effect=create_summary_events_during_refresh,
+        ):
+            summary = await self.cache.get_summary("subnet")
+
+        self.assertEqual([e["id"] for e in summary["events"]], ["event-a", "event-b"])
+        self.assertEqual(summary["total_orders"], 4)
+
+    async def test_event_names_without_api_call(self):
+        """
+        Tests that autocomplete suggestions are served from the cache only
+        """
+
+        self.assertEqual(self.cache.get_event_names("syd"), [])
+        await asyncio.gather(*self.cache.background_tasks)
+        request_count = len(self.paths)
+
+        self.assertEqual(
+            self.cache.get_event_names("syd"), ["DadLAN Sydney Subnet Oct 2024"]
+        )
+        self.assertEqual(len(self.paths), request_count)
+
+
+class TestHumanitixServer(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests the Humanitix client against the local stand-in server
+    """
+
+    async def asyncSetUp(self):
+        events, tickets = create_synthetic_data(3, 150)
+        self.server = HumanitixServer(
+            events=events, tickets=tickets, error_rate=0.2, retry_after=0.01, seed=1
+        ).start()
+
+        self.client = HumanitixClient()
+        self.client.base_path = f"{self.server.url}/v1"
+        self.client.scheduler = RequestScheduler(rate=0, burst=1, max_in_flight=4)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        self.server.stop()
+
+    async def test_summary(self):
+        """
+        Tests that every page of every event is summarised despite injected errors
+        """
+
+        events = Events.model_validate(await self.client.get_all_events()).events
+        summary = await create_summary_from_event_data(events, TicketStore(self.client))
+
+        self.assertEqual(summary["total_orders"], 3 * 150)
+        throttled = sum(s.throttled for s in self.client.scheduler.stats.values())
+        self.assertEqual(len(self.server.requests), 1 + 3 * 2 + throttled)
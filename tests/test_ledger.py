@@ -0,0 +1,198 @@
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytz
+from summariser.aggregates import SpendAggregates
+from summariser.history import compact_token_history
+from summariser.ledger import SpendLedger, apply_entries_to_token_history
+from summariser.recorder import SpendRecorder
+from summariser.schemas import SpendEntry, TokenHistory
+
+
+class TestSpendLedger(unittest.TestCase):
+    """
+    Tests the local append-only spend ledger
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.ledger = SpendLedger(Path(self.temp_dir.name, "ledger.sqlite3"))
+        self.created_at = datetime(2024, 5, 17, 10, 30, tzinfo=pytz.UTC)
+
+    def tearDown(self):
+        self.ledger.close()
+        self.temp_dir.cleanup()
+
+    def create_entry(self, idx: int) -> SpendEntry:
+        return SpendEntry(
+            created_at=self.created_at + timedelta(minutes=idx),
+            user_id=100 + idx % 3,
+            user_name=f"person{idx % 3}",
+            user_display_name=f"Person {idx % 3}",
+            channel_id=200 + idx % 2,
+            channel_name=f"channel-{idx % 2}",
+            tokens=1000 + idx,
+            cached_tokens=idx,
+            cost=0.0005,
+        )
+
+    def test_append_and_sync(self):
+        """
+        Tests that appended entries are returned as unsynced until marked
+        """
+
+        self.assertTrue(self.ledger.is_empty())
+
+        self.ledger.append(self.create_entry(0))
+        self.ledger.append_many([self.create_entry(1), self.create_entry(2)])
+
+        unsynced = self.ledger.get_unsynced()
+        self.assertEqual(len(unsynced), 3)
+        self.assertEqual(unsynced[0][1], self.create_entry(0))
+
+        self.ledger.mark_synced([entry_id for entry_id, _ in unsynced[:2]])
+        self.assertEqual(len(self.ledger.get_unsynced()), 1)
+        self.assertEqual(len(self.ledger.get_entries()), 3)
+
+    def test_get_entries_range(self):
+        """
+        Tests filtering entries by a time range
+        """
+
+        self.ledger.append_many([self.create_entry(i) for i in range(10)])
+
+        entries = self.ledger.get_entries(
+            self.created_at + timedelta(minutes=2),
+            self.created_at + timedelta(minutes=5),
+        )
+        self.assertEqual([e.tokens for e in entries], [1002, 1003, 1004])
+
+    def test_import_round_trip(self):
+        """
+        Tests that a portal token history survives an import and re-export
+        """
+
+        entries = [self.create_entry(i) for i in range(5)]
+        token_history = apply_entries_to_token_history(TokenHistory(), entries)
+
+        imported = self.ledger.import_token_history(token_history)
+
+        self.assertEqual(imported, 5)
+        self.assertEqual(self.ledger.get_unsynced(), [])
+        self.assertEqual(self.ledger.get_entries(), entries)
+        self.assertEqual(
+            apply_entries_to_token_history(TokenHistory(), self.ledger.get_entries()),
+            token_history,
+        )
+
+    def test_import_compacted_history(self):
+        """
+        Tests that rolled up months are imported once, with their request counts
+        """
+
+        entries = [
+            SpendEntry(
+                created_at=self.created_at + timedelta(hours=idx),
+                user_id=100,
+                user_name="person0",
+                user_display_name="Person 0",
+                channel_id=200,
+                channel_name="channel-0",
+                tokens=100,
+                cost=1.0,
+            )
+            for idx in range(3)
+        ]
+        token_history = compact_token_history(
+            apply_entries_to_token_history(TokenHistory(), entries),
+            self.created_at + timedelta(days=31),
+        )
+
+        self.ledger.import_token_history(token_history)
+        counted = [e for e in self.ledger.get_entries() if not e.breakdown_only]
+
+        self.assertAlmostEqual(sum(e.cost for e in counted), 3.0)
+        self.assertEqual(sum(e.tokens for e in counted), 300)
+        self.assertEqual(sum(e.requests for e in counted), 3)
+
+        aggregates = SpendAggregates()
+        aggregates.rebuild(self.ledger.get_monthly_costs())
+        aggregates.rebuild_daily(
+            self.ledger.get_daily_costs(self.created_at - timedelta(days=30))
+        )
+
+        self.assertAlmostEqual(
+            aggregates.get_total_cost_month_user(100, self.created_at), 3.0
+        )
+        self.assertAlmostEqual(
+            aggregates.get_total_cost_month_channel(200, self.created_at), 3.0
+        )
+        self.assertAlmostEqual(
+            aggregates.get_total_cost_month_all_users(self.created_at), 3.0
+        )
+        self.assertAlmostEqual(
+            aggregates.get_total_cost_month_all_channels(self.created_at), 3.0
+        )
+        self.assertAlmostEqual(
+            aggregates.get_total_cost_day(datetime(2024, 5, 1, tzinfo=pytz.UTC)), 3.0
+        )
+
+    def test_aggregates_rebuilt_from_ledger(self):
+        """
+        Tests that aggregates rebuilt from the ledger match aggregates updated per entry
+        """
+
+        entries = [self.create_entry(i * 60 * 24 * 10) for i in range(12)]
+        self.ledger.append_many(entries)
+
+        running = SpendAggregates()
+        for entry in entries:
+            running.add(entry)
+
+        rebuilt = SpendAggregates()
+        rebuilt.rebuild(self.ledger.get_monthly_costs())
+
+        month_dt = self.created_at + timedelta(days=20)
+        expected_user_cost = sum(
+            e.cost
+            for e in entries
+            if e.user_id == 100
+            and (e.created_at.year, e.created_at.month)
+            == (month_dt.year, month_dt.month)
+        )
+
+        self.assertAlmostEqual(
+            rebuilt.get_total_cost_month_user(100, month_dt), expected_user_cost
+        )
+        self.assertAlmostEqual(
+            rebuilt.get_total_cost_month_channel(200, month_dt),
+            running.get_total_cost_month_channel(200, month_dt),
+        )
+        self.assertAlmostEqual(
+            rebuilt.get_total_cost_month_all_users(month_dt),
+            running.get_total_cost_month_all_users(month_dt),
+        )
+        self.assertGreater(expected_user_cost, 0.0)
+        self.assertEqual(
+            rebuilt.get_total_cost_month_all_channels(datetime(2000, 1, 1)), 0.0
+        )
+
+    def test_recorder_write_behind(self):
+        """
+        Tests that recorded spend is counted straight away and written on flush
+        """
+
+        recorder = SpendRecorder(self.ledger, SpendAggregates())
+        for i in range(3):
+            recorder.push(self.create_entry(i))
+
+        self.assertTrue(self.ledger.is_empty())
+        self.assertAlmostEqual(
+            recorder.aggregates.get_total_cost_month_all_users(self.created_at), 0.0015
+        )
+
+        self.assertEqual(recorder.flush(), 3)
+        self.assertEqual(len(self.ledger.get_unsynced()), 3)
+        self.assertEqual(recorder.flush(), 0)
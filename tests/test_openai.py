@@ -1,10 +1,12 @@
 import unittest
 from typing import Dict, List
+from unittest.mock import patch
 
+from summariser import openai
 from summariser.messages import format_messages_for_summary
 from summariser.openai import ChatGPTClient
 
-from app.config import get_config
+from app.config import ModelRoute, get_config
 
 
 class TestChatGPTClient(unittest.TestCase):
@@ -96,3 +98,120 @@ class TestChatGPTClient(unittest.TestCase):
         )
 
         print(f"Number of tokens: {num_tokens}")
+
+
+class TestChatGPTClientCost(unittest.TestCase):
+    """
+    Tests the request cost calculation
+    """
+
+    def setUp(self):
+        self.client = ChatGPTClient("gpt-4o-mini")
+
+    def test_cached_token_cost(self):
+        """
+        Tests that cached prompt tokens are billed at the cached token cost factor
+        """
+
+        with patch.object(openai.config, "OPENAI_CACHED_TOKEN_COST_FACTOR", 0.5):
+            cost = self.client.calculate_cost(1000, 400, token_cost=0.001)
+
+        self.assertAlmostEqual(cost, 600 * 0.001 + 400 * 0.001 * 0.5)
+
+    def test_no_cached_tokens(self):
+        """
+        Tests that a request without cached tokens is billed at the full token cost
+        """
+
+        with patch.object(openai.config, "OPENAI_TOKEN_COST", 0.002):
+            self.assertAlmostEqual(self.client.calculate_cost(500), 1.0)
+
+
+class TestChatGPTClientRoute(unittest.TestCase):
+    """
+    Tests routing prompts to model tiers
+    """
+
+    def setUp(self):
+        self.client = ChatGPTClient("gpt-4o-mini")
+        self.prompt = [{"role": "user", "content": "Hello"}]
+        self.routes = [
+            ModelRoute(
+                name="small",
+                model="small-model",
+                max_prompt_tokens=2000,
+                max_period_hours=24,
+                max_tokens=300,
+                token_cost=0.0000001,
+            ),
+            ModelRoute(
+                name="large",
+                model="large-model",
+                max_prompt_tokens=50000,
+                max_tokens=800,
+            ),
+        ]
+
+        patches = [
+            patch.object(openai.config, "SUMMARISER_MODEL_ROUTES", self.routes),
+            patch.object(openai.config, "SUMMARISER_OUTPUT_TOKEN_RATIO", 0.1),
+            patch.object(openai.config, "SUMMARISER_MIN_OUTPUT_TOKENS", 100),
+            patch.object(openai.config, "OPENAI_TOKEN_COST", 0.000001),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def route(self, prompt_tokens: int, period_hours: float = 24):
+        with patch.object(
+            self.client, "estimate_prompt_tokens", return_value=prompt_tokens
+        ):
+            return self.client.route(self.prompt, period_hours, "default-model", 150)
+
+    def test_route_by_size_and_period(self):
+        """
+        Tests that the first route whose prompt size and time period fit is picked
+        """
+
+        route = self.route(1500)
+        self.assertEqual((route.name, route.model), ("small", "small-model"))
+        self.assertEqual(route.token_cost, 0.0000001)
+
+        self.assertEqual(self.route(3000).name, "large")
+        self.assertEqual(self.route(1500, period_hours=48).name, "large")
+
+        # Routes without a token cost use the default token cost
+        self.assertEqual(self.route(3000).token_cost, 0.000001)
+
+    def test_default_route(self):
+        """
+        Tests that prompts too large for every route use the default model
+        """
+
+        route = self.route(60000)
+
+        self.assertEqual((route.name, route.model), ("default", "default-model"))
+        self.assertEqual(route.estimated_prompt_tokens, 60000)
+
+    def test_adaptive_max_tokens(self):
+        """
+        Tests that the output budget scales with the prompt between the minimum and the
+        route's cap
+        """
+
+        # 10% of the prompt
+        self.assertEqual(self.route(2000, period_hours=48).max_tokens, 200)
+        # No less than the minimum output tokens
+        self.assertEqual(self.route(300).max_tokens, 100)
+        # No more than the route's max tokens
+        self.assertEqual(self.route(20000).max_tokens, 800)
+        # The default route is capped by the max tokens set on the portal
+        self.assertEqual(self.route(60000).max_tokens, 150)
+
+    def test_minimum_above_cap(self):
+        """
+        Tests that a route cap below the minimum output tokens still applies
+        """
+
+        with patch.object(openai.config, "SUMMARISER_MIN_OUTPUT_TOKENS", 500):
+            self.assertEqual(self.route(1500).max_tokens, 300)
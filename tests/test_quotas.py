@@ -0,0 +1,104 @@
+import sys
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import pytz
+from summariser import quotas
+from summariser.aggregates import SpendAggregates
+from summariser.quotas import SpendQuotas
+from summariser.schemas import SpendEntry
+
+
+class TestSpendQuotas(unittest.TestCase):
+    """
+    Tests the pre-flight spend quota checks
+    """
+
+    def setUp(self):
+        self.aggregates = SpendAggregates()
+        self.quotas = SpendQuotas(self.aggregates)
+
+        self.aggregates.add(
+            SpendEntry(
+                created_at=datetime.now(tz=pytz.UTC),
+                user_id=100,
+                channel_id=200,
+                tokens=1000,
+                cost=0.3,
+            )
+        )
+
+    def test_no_quotas(self):
+        """
+        Tests that quotas of 0 leave the budget unlimited
+        """
+
+        with patch.multiple(
+            quotas.config,
+            SUMMARISER_QUOTA_USER_MONTHLY=0.0,
+            SUMMARISER_QUOTA_CHANNEL_MONTHLY=0.0,
+            SUMMARISER_QUOTA_DAILY=0.0,
+        ):
+            remaining, _ = self.quotas.get_remaining_budget(100, 200)
+
+        self.assertEqual(remaining, float("inf"))
+
+    def test_smallest_quota_applies(self):
+        """
+        Tests that the quota with the least budget left is reported
+        """
+
+        with patch.multiple(
+            quotas.config,
+            SUMMARISER_QUOTA_USER_MONTHLY=1.0,
+            SUMMARISER_QUOTA_CHANNEL_MONTHLY=2.0,
+            SUMMARISER_QUOTA_DAILY=0.5,
+        ):
+            remaining, quota_name = self.quotas.get_remaining_budget(100, 200)
+            self.assertAlmostEqual(remaining, 0.2)
+            self.assertEqual(quota_name, "the daily")
+
+            remaining, quota_name = self.quotas.get_remaining_budget(101, 200)
+            self.assertAlmostEqual(remaining, 0.2)
+
+        with patch.multiple(
+            quotas.config,
+            SUMMARISER_QUOTA_USER_MONTHLY=0.25,
+            SUMMARISER_QUOTA_CHANNEL_MONTHLY=0.0,
+            SUMMARISER_QUOTA_DAILY=0.0,
+        ):
+            remaining, quota_name = self.quotas.get_remaining_budget(100, 200)
+            self.assertEqual(remaining, 0.0)
+            self.assertEqual(quota_name, "your monthly")
+
+    def test_affordable_prompt_tokens(self):
+        """
+        Tests that the completion budget is kept out of the affordable prompt
+        """
+
+        self.assertEqual(
+            self.quotas.get_affordable_prompt_tokens(0.001, 200, 0.000001), 800
+        )
+        self.assertEqual(
+            self.quotas.get_affordable_prompt_tokens(0.0, 200, 0.000001), 0
+        )
+
+    def test_affordable_prompt_tokens_limit(self):
+        """
+        Tests that the affordable prompt is capped at the route's prompt limit, and that a
+        route without a token cost gets the whole prompt limit
+        """
+
+        self.assertEqual(
+            self.quotas.get_affordable_prompt_tokens(0.001, 200, 0.000001, 500), 500
+        )
+        self.assertEqual(
+            self.quotas.get_affordable_prompt_tokens(0.0, 200, 0.0, 2000), 2000
+        )
+        self.assertEqual(
+            self.quotas.get_affordable_prompt_tokens(0.0, 200, -0.000001, 2000), 2000
+        )
+        self.assertEqual(
+            self.quotas.get_affordable_prompt_tokens(0.0, 200, 0.0), sys.maxsize
+        )
@@ -0,0 +1,500 @@
+import tempfile
+import unittest
+import unittest.mock
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytz
+from config import ModelRoute
+from summariser import client as summariser_client
+from summariser import openai, quotas
+from summariser.client import SummariserClient
+from summariser.messages import estimate_tokens
+from summariser.schemas import (
+    ChatMessage,
+    OpenAIResponse,
+    PreparedDailySummary,
+    SummaryRoute,
+)
+
+
+def create_message(idx: int, created_at: datetime) -> ChatMessage:
+    return ChatMessage(
+        id=idx,
+        name=f"user{idx}",
+        display_name=f"User {idx}",
+        message=f"Message number {idx}",
+        created_at=created_at,
+    )
+
+
+class SummariserClientTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Sets up a summariser with a temporary ledger and the portal variables at their defaults
+    """
+
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        ledger_file = str(Path(self.temp_dir.name, "ledger.sqlite3"))
+
+        patches = [
+            patch.object(
+                summariser_client.config, "SUMMARISER_LEDGER_FILE", ledger_file
+            ),
+            patch.object(
+                summariser_client,
+                "get_variable",
+                AsyncMock(side_effect=lambda name, default: default),
+            ),
+            patch.object(
+                summariser_client,
+                "get_variables",
+                AsyncMock(side_effect=lambda defaults: dict(defaults)),
+            ),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.summariser = SummariserClient()
+        self.created_at = datetime(2024, 5, 17, 10, 0, tzinfo=pytz.UTC)
+        self.channel = SimpleNamespace(id=200, name="announcements")
+        self.user = SimpleNamespace(id=100, name="bot", display_name="Summary Bot")
+
+    async def asyncTearDown(self):
+        self.summariser.ledger.close()
+        self.temp_dir.cleanup()
+
+
+class TestPromptLayout(SummariserClientTestCase):
+    """
+    Tests the prompt layout used for provider prefix caching
+    """
+
+    async def test_instructions_around_messages(self):
+        """
+        Tests that the prefix is a single leading system message, followed by the messages
+        in chronological order and then the suffix as the final system message
+        """
+
+        messages = [
+            create_message(idx, self.created_at + timedelta(minutes=idx))
+            for idx in (2, 0, 1)
+        ]
+
+        prompt = await self.summariser.prepare_prompt(messages)
+
+        self.assertEqual(
+            [p["role"] for p in prompt], ["system"] + ["user"] * 3 + ["system"]
+        )
+        self.assertEqual(prompt[0]["content"], summariser_client.DEFAULT_PROMPT_PREFIX)
+        self.assertEqual(prompt[-1]["content"], summariser_client.DEFAULT_PROMPT_SUFFIX)
+        self.assertEqual(
+            [p["content"].split(": ")[-1] for p in prompt[1:-1]],
+            ["Message number 0", "Message number 1", "Message number 2"],
+        )
+
+    async def test_shared_prefix(self):
+        """
+        Tests that a later prompt over more messages starts with the earlier prompt, up to
+        the suffix
+        """
+
+        messages = [
+            create_message(idx, self.created_at + timedelta(minutes=idx))
+            for idx in range(5)
+        ]
+
+        earlier = await self.summariser.prepare_prompt(messages[:3])
+        later = await self.summariser.prepare_prompt(messages)
+
+        self.assertEqual(later[: len(earlier) - 1], earlier[:-1])
+        self.assertEqual(later[-1], earlier[-1])
+
+
+class TestDailySummary(SummariserClientTestCase):
+    """
+    Tests preparing the daily summary ahead of time and topping it up before posting
+    """
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+
+        self.messages = [
+            create_message(idx, self.created_at + timedelta(minutes=idx))
+            for idx in range(3)
+        ]
+        self.summariser.get_messages_daily = AsyncMock(
+            side_effect=lambda channels, threads: list(self.messages)
+        )
+        self.summariser.client.call_api = unittest.mock.Mock(
+            return_value=OpenAIResponse(
+                response="Updated summary",
+                total_tokens=1000,
+                completion_tokens=100,
+                prompt_tokens=900,
+            )
+        )
+        patcher = patch.object(
+            self.summariser.client, "estimate_prompt_tokens", return_value=900
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.prepared = PreparedDailySummary(
+            response="Prepared summary",
+            prepared_at=self.created_at + timedelta(minutes=5),
+            last_message_at=self.messages[-1].created_at,
+            total_tokens=500,
+        )
+
+    def get_recorded_count(self) -> int:
+        return self.summariser.recorder.queue.qsize()
+
+    async def top_up(self) -> PreparedDailySummary:
+        return await self.summariser.top_up_summary_daily_message(
+            self.prepared, self.channel, self.user, [], []  # type: ignore
+        )
+
+    async def test_prepare(self):
+        """
+        Tests that the prepared summary covers the latest message and its spend is recorded
+        """
+
+        with patch.object(
+            self.summariser,
+            "reduce_messages",
+            side_effect=lambda messages: messages[:1],
+        ):
+            prepared = await self.summariser.prepare_summary_daily_message(
+                self.channel, self.user, [], []  # type: ignore
+            )
+
+        self.assertEqual(prepared.response, "Updated summary")
+        # Messages dropped by the reduction are not sent again in the top up
+        self.assertEqual(prepared.last_message_at, self.messages[-1].created_at)
+        self.assertEqual(self.get_recorded_count(), 1)
+        self.assertGreater(
+            self.summariser.aggregates.get_total_cost_month_channel(200), 0
+        )
+
+    async def test_prepare_empty_response(self):
+        """
+        Tests that an empty response prepares no summary but its spend is still recorded
+        """
+
+        self.summariser.client.call_api.return_value.response = ""
+        prepared = await self.summariser.prepare_summary_daily_message(
+            self.channel, self.user, [], []  # type: ignore
+        )
+
+        self.assertIsNone(prepared)
+        self.assertEqual(self.get_recorded_count(), 1)
+
+    async def test_top_up_no_new_messages(self):
+        """
+        Tests that the prepared summary is kept without an API call if nothing is new
+        """
+
+        prepared = await self.top_up()
+
+        self.assertIs(prepared, self.prepared)
+        self.summariser.client.call_api.assert_not_called()
+        self.assertEqual(self.get_recorded_count(), 0)
+
+    async def test_top_up_new_messages(self):
+        """
+        Tests that only the new messages are sent, capped at the route's max tokens
+        """
+
+        self.messages.append(create_message(3, self.created_at + timedelta(minutes=10)))
+
+        prepared = await self.top_up()
+
+        self.assertEqual(prepared.response, "Updated summary")
+        self.assertEqual(prepared.last_message_at, self.messages[-1].created_at)
+        self.assertEqual(prepared.total_tokens, 1500)
+        self.assertEqual(self.get_recorded_count(), 1)
+
+        prompt = self.summariser.client.call_api.call_args.args[0]
+        self.assertEqual(
+            prompt[1], {"role": "assistant", "content": "Prepared summary"}
+        )
+        self.assertEqual(
+            [p["content"].split(": ")[-1] for p in prompt if p["role"] == "user"],
+            ["Message number 3"],
+        )
+        self.assertEqual(
+            prompt[-1],
+            {"role": "system", "content": summariser_client.DEFAULT_PROMPT_SUFFIX},
+        )
+
+        route = self.summariser.client.route(
+            prompt, 24, self.summariser.model, self.summariser.max_tokens
+        )
+        self.assertEqual(
+            self.summariser.client.call_api.call_args.kwargs["max_tokens"],
+            route.max_tokens,
+        )
+
+    async def test_top_up_empty_response(self):
+        """
+        Tests that the prepared summary is kept if the top up has no response
+        """
+
+        self.messages.append(create_message(3, self.created_at + timedelta(minutes=10)))
+        self.summariser.client.call_api.return_value.response = ""
+
+        prepared = await self.top_up()
+
+        self.assertIs(prepared, self.prepared)
+        self.assertEqual(self.get_recorded_count(), 1)
+
+
+class TestModDigest(SummariserClientTestCase):
+    """
+    Tests collecting mod notifications into a digest, with outliers posted straight away
+    """
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+
+        patcher = patch.multiple(
+            summariser_client.config,
+            SUMMARISER_MOD_DIGEST_INTERVAL=3600,
+            SUMMARISER_MOD_DIGEST_OUTLIER_COST=0.01,
+            SUMMARISER_WARM_ENABLE=False,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.mod_channel = SimpleNamespace(send=AsyncMock())
+        self.ctx = SimpleNamespace(
+            guild=SimpleNamespace(
+                get_channel=unittest.mock.Mock(return_value=self.mod_channel)
+            ),
+            channel=SimpleNamespace(
+                id=200, jump_url="https://discord.com/channels/1/200"
+            ),
+            user=SimpleNamespace(id=100, name="person", display_name="Person"),
+        )
+
+    async def notify(self, total_tokens: int, route_name: str = "small"):
+        """
+        Sends a mod notification for a generation costing 0.00001 per token
+        """
+
+        await self.summariser.send_mod_notification(
+            self.ctx,  # type: ignore
+            OpenAIResponse(
+                response=f"Summary of {total_tokens} tokens",
+                total_tokens=total_tokens,
+                completion_tokens=50,
+                prompt_tokens=total_tokens - 50,
+                duration=1.5,
+            ),
+            SummaryRoute(
+                name=route_name,
+                model="gpt-4o-mini",
+                max_tokens=150,
+                token_cost=0.00001,
+                estimated_prompt_tokens=total_tokens - 50,
+            ),
+        )
+
+    async def test_digest_contents(self):
+        """
+        Tests that generations below the cutoff are collected and reported together
+        """
+
+        await self.notify(100)
+        await self.notify(999, route_name="large")
+
+        self.mod_channel.send.assert_not_called()
+        self.assertEqual(len(self.summariser.pending_generations), 2)
+
+        self.assertEqual(
+            await self.summariser.send_mod_digest(self.mod_channel),  # type: ignore
+            2,
+        )
+        self.assertEqual(self.summariser.pending_generations, [])
+        self.mod_channel.send.assert_called_once()
+
+        embed = self.mod_channel.send.call_args.kwargs["embed"]
+        self.assertTrue(embed.title.startswith("GenAI summaries since"))
+        self.assertIn("Summaries = `2`", embed.description)
+        self.assertIn("Tokens = `1099`", embed.description)
+        self.assertIn("Estimated cost = `US $0.010990`", embed.description)
+        self.assertIn(
+            "https://discord.com/channels/1/200 by Person (person): `100` tokens "
+            "(cached = `0`), `US $0.001000`, `1.50s`, route `small`",
+            embed.description,
+        )
+        self.assertIn("`US $0.009990`, `1.50s`, route `large`", embed.description)
+
+        self.assertEqual(
+            await self.summariser.send_mod_digest(self.mod_channel),  # type: ignore
+            0,
+        )
+        self.mod_channel.send.assert_called_once()
+
+    async def test_outlier_cutoff(self):
+        """
+        Tests that a generation costing at least the cutoff is posted straight away
+        """
+
+        await self.notify(1000)
+
+        self.assertEqual(self.summariser.pending_generations, [])
+        self.assertEqual(self.mod_channel.send.call_count, 2)
+        self.assertTrue(
+            self.mod_channel.send.call_args_list[0]
+            .kwargs["embed"]
+            .title.startswith("High-cost GenAI summary for Person")
+        )
+
+    async def test_digest_disabled(self):
+        """
+        Tests that every generation is posted straight away without a digest interval
+        """
+
+        with patch.object(
+            summariser_client.config, "SUMMARISER_MOD_DIGEST_INTERVAL", 0
+        ):
+            await self.notify(100)
+
+        self.assertEqual(self.summariser.pending_generations, [])
+        self.assertEqual(self.mod_channel.send.call_count, 2)
+        self.assertTrue(
+            self.mod_channel.send.call_args_list[0]
+            .kwargs["embed"]
+            .title.startswith("GenAI summary for Person")
+        )
+
+
+class TestSpendQuotaCheck(SummariserClientTestCase):
+    """
+    Tests moving, trimming and rejecting digests that would go over a spend quota
+    """
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+
+        self.user_quota = 0.0
+        for module in (summariser_client, quotas, openai):
+            patcher = patch.multiple(
+                module.config,
+                SUMMARISER_QUOTA_CHANNEL_MONTHLY=0.0,
+                SUMMARISER_QUOTA_DAILY=0.0,
+                SUMMARISER_QUOTA_MIN_PROMPT_TOKENS=500,
+                SUMMARISER_MODEL_ROUTES=[
+                    ModelRoute(
+                        name="cheap",
+                        model="gpt-4o-mini",
+                        max_prompt_tokens=100_000,
+                        max_tokens=100,
+                        token_cost=0.000001,
+                    )
+                ],
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # The prompt estimate counts a few more tokens per message than the quick
+        # estimate used to trim, like the tokenizer does
+        patcher = patch.object(
+            self.summariser.client,
+            "estimate_prompt_tokens",
+            side_effect=lambda prompt, model: sum(
+                estimate_tokens(p["content"]) + 3 for p in prompt
+            ),
+        )
+        self.estimate_prompt_tokens = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.messages = [
+            ChatMessage(
+                id=idx,
+                name=f"user{idx % 10}",
+                display_name=f"User {idx % 10}",
+                message=f"Message number {idx} about the LAN party " * 3,
+                created_at=self.created_at + timedelta(minutes=idx),
+            )
+            for idx in range(2000)
+        ]
+        self.ctx = SimpleNamespace(
+            user=SimpleNamespace(id=100, name="person"),
+            channel_id=200,
+            followup=SimpleNamespace(send=AsyncMock()),
+        )
+
+    async def check(self, user_quota: float):
+        """
+        Checks the quotas for a digest of every message on a route costing 0.00001 per
+        token, with a monthly user quota
+        """
+
+        prompt = await self.summariser.prepare_prompt(self.messages)
+        route = SummaryRoute(
+            name="default",
+            model="gpt-4o",
+            max_tokens=100,
+            token_cost=0.00001,
+            estimated_prompt_tokens=self.summariser.client.estimate_prompt_tokens(
+                prompt, "gpt-4o"
+            ),
+        )
+
+        with patch.object(quotas.config, "SUMMARISER_QUOTA_USER_MONTHLY", user_quota):
+            return await self.summariser.check_spend_quotas(
+                self.ctx, self.messages, prompt, route  # type: ignore
+            )
+
+    async def test_within_quota(self):
+        """
+        Tests that a digest within the quota keeps its route and prompt
+        """
+
+        prompt, route = await self.check(10.0)
+
+        self.assertEqual(route.name, "default")
+        self.assertEqual(len(prompt), len(self.messages) + 2)
+
+    async def test_moved_to_cheapest_route(self):
+        """
+        Tests that a digest the cheapest route can afford is moved to it untrimmed
+        """
+
+        prompt, route = await self.check(0.1)
+
+        self.assertEqual(route.name, "cheap")
+        self.assertEqual(len(prompt), len(self.messages) + 2)
+        self.assertLessEqual(self.summariser.client.estimate_route_cost(route), 0.1)
+
+    async def test_trimmed_within_quota(self):
+        """
+        Tests that a trimmed digest is checked again and stays within the quota
+        """
+
+        prompt, route = await self.check(0.0015)
+
+        self.assertEqual(route.name, "cheap")
+        self.assertGreater(len(prompt), 2)
+        self.assertLess(len(prompt), len(self.messages) + 2)
+        self.assertEqual(prompt[-1]["content"], summariser_client.DEFAULT_PROMPT_SUFFIX)
+        self.assertEqual(
+            route.estimated_prompt_tokens,
+            self.summariser.client.estimate_prompt_tokens(prompt, route.model),
+        )
+        self.assertLessEqual(self.summariser.client.estimate_route_cost(route), 0.0015)
+        self.ctx.followup.send.assert_not_called()
+
+    async def test_rejected(self):
+        """
+        Tests that a digest is rejected when the quota does not pay for the minimum prompt
+        """
+
+        self.assertIsNone(await self.check(0.0005))
+        self.ctx.followup.send.assert_called_once()
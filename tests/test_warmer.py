@@ -0,0 +1,104 @@
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+import pytz
+from summariser import warmer
+from summariser.schemas import ChannelCacheResponse
+from summariser.warmer import DigestWarmer
+
+
+class TestDigestWarmer(unittest.TestCase):
+    """
+    Tests choosing channels to warm and keeping warming within the daily budget
+    """
+
+    def setUp(self):
+        patcher = patch.multiple(
+            warmer.config,
+            SUMMARISER_WARM_MESSAGE_THRESHOLD=50,
+            SUMMARISER_WARM_BURST_MESSAGES=10,
+            SUMMARISER_WARM_QUIET_SECONDS=300,
+            SUMMARISER_WARM_DAILY_BUDGET=0.05,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.warmer = DigestWarmer()
+        self.now = datetime(2024, 5, 17, 10, 0, tzinfo=pytz.UTC)
+
+    def record_messages(self, channel: int, count: int, last_message_at: datetime):
+        for idx in range(count):
+            self.warmer.record_message(
+                channel, last_message_at - timedelta(seconds=count - 1 - idx)
+            )
+
+    def test_message_threshold(self):
+        """
+        Tests that busy channels are warmed, busiest first, and quiet ones are not
+        """
+
+        self.record_messages(1, 50, self.now)
+        self.record_messages(2, 80, self.now)
+        self.record_messages(3, 49, self.now)
+
+        self.assertEqual(self.warmer.get_channels_to_warm(self.now), [2, 1])
+
+    def test_quiet_after_burst(self):
+        """
+        Tests that a burst is only warmed once the channel has gone quiet
+        """
+
+        self.record_messages(1, 10, self.now)
+        self.record_messages(2, 9, self.now - timedelta(minutes=10))
+
+        self.assertEqual(self.warmer.get_channels_to_warm(self.now), [])
+        self.assertEqual(
+            self.warmer.get_channels_to_warm(self.now + timedelta(seconds=301)), [1]
+        )
+
+    def test_mark_warmed(self):
+        """
+        Tests that a warmed channel needs new messages to be warmed again
+        """
+
+        self.record_messages(1, 60, self.now)
+        self.warmer.mark_warmed(1)
+
+        self.assertEqual(self.warmer.get_channels_to_warm(self.now), [])
+
+    def test_daily_budget(self):
+        """
+        Tests that spend counts against the budget until the local date changes
+        """
+
+        self.warmer.record_spend(0.03)
+        self.assertAlmostEqual(self.warmer.get_remaining_budget(), 0.02)
+
+        self.warmer.record_spend(0.03)
+        self.assertEqual(self.warmer.get_remaining_budget(), 0.0)
+
+        with patch.object(self.warmer, "get_local_date", return_value=date(2100, 1, 1)):
+            self.assertAlmostEqual(self.warmer.get_remaining_budget(), 0.05)
+
+    def test_hit_rate(self):
+        """
+        Tests that only warmed entries count towards the hit rate, once each
+        """
+
+        expires_at = self.now + timedelta(minutes=30)
+        warmed = ChannelCacheResponse(
+            key="1-24h", response="", expires_at=expires_at, warmed=True
+        )
+        requested = ChannelCacheResponse(
+            key="2-24h", response="", expires_at=expires_at
+        )
+
+        self.warmer.record_spend(0.01)
+        self.warmer.record_spend(0.01)
+        self.warmer.record_hit(warmed)
+        self.warmer.record_hit(warmed)
+        self.warmer.record_hit(requested)
+
+        self.assertEqual(self.warmer.warmed_hits, 2)
+        self.assertEqual(self.warmer.get_hit_rate(), 0.5)